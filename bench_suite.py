@@ -0,0 +1,309 @@
+# bench_suite.py
+"""
+Headless benchmark of the routing methods on shared instance sets.
+Runs the VQC pipeline, OR-Tools, nearest-truck and random assignment on the
+same instances and records distance, gap to OR-Tools, capacity overloads,
+wall time, per-instance latency percentiles, per-stage span totals and peak
+resident memory, written as JSON for benchmark.py (or anything else) to
+display.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from distance import leg_distances
+from spatial_index import nearest_neighbor_order, project
+from construct_routes import build_routes, DEPOT
+from solve_labels import solve_cvrp_anytime
+from inference import predict_assignments, warm_up
+import telemetry
+
+INPUT_DIR = "data/raw"
+RESULTS_FILE = "data/reports/benchmark.json"
+ORTOOLS_TIME_LIMIT = 1.0  # seconds per instance
+MEMORY_SAMPLE = 10  # instances re-run in a fresh process for peak RSS
+METHOD_NAMES = {
+    "vqc": "Q-RouteNet (QML)",
+    "ortools": "OR-Tools",
+    "nearest_truck": "Nearest Truck",
+    "random": "Random Assignment",
+}
+
+
+def _instance_args(instance):
+    return (np.asarray(instance["customers"], dtype=np.float64).tolist(),
+            np.asarray(instance["demands"]).astype(int).tolist(),
+            int(instance.get("num_vehicles", 3)),
+            int(instance.get("vehicle_capacity", 15)),
+            [float(x) for x in instance.get("depot", DEPOT)])
+
+
+def _nn_tours(customers, assignments, num_vehicles, depot):
+    """Nearest-neighbour tour of each truck's customers, as global customer ids."""
+    ids = np.asarray(assignments)
+    tours = []
+    for vid in range(num_vehicles):
+        members = np.flatnonzero(ids == vid)
+        if len(members):
+            order = nearest_neighbor_order(project(np.asarray(customers)[members], depot[0]),
+                                           project([depot], depot[0])[0])
+            tours.append(members[order].tolist())
+    return tours
+
+
+def run_vqc(customers, demands, num_vehicles, capacity, depot, seed=0):
+    assignments = predict_assignments(customers, demands)
+    routes, _ = build_routes(customers, demands, assignments, capacity, num_vehicles,
+                             local_search=True, depot=depot)
+    return [r["stop_ids"] for r in routes]
+
+
+def run_ortools(customers, demands, num_vehicles, capacity, depot, seed=0, time_limit=ORTOOLS_TIME_LIMIT):
+    result = solve_cvrp_anytime(customers, demands, num_vehicles, capacity, depot, time_limit)
+    return None if result is None else [r for r in result["routes"] if r]
+
+
+def run_nearest_truck(customers, demands, num_vehicles, capacity, depot, seed=0):
+    """
+    Customers, nearest to the depot first, join the truck whose last stop
+    (or the depot, for an empty truck) is closest. Capacity is ignored.
+    """
+    points = np.asarray(customers, dtype=np.float64)
+    order = np.argsort(leg_distances(np.tile(depot, (len(points), 1)), points), kind="stable")
+    last = np.tile(np.asarray(depot, dtype=np.float64), (num_vehicles, 1))
+    assignments = [0] * len(points)
+    for i in order:
+        truck = int(np.argmin(leg_distances(last, np.tile(points[i], (num_vehicles, 1)))))
+        assignments[i] = truck
+        last[truck] = points[i]
+    return _nn_tours(customers, assignments, num_vehicles, depot)
+
+
+def run_random(customers, demands, num_vehicles, capacity, depot, seed=0):
+    assignments = np.random.default_rng(seed).integers(num_vehicles, size=len(customers))
+    return _nn_tours(customers, assignments, num_vehicles, depot)
+
+
+METHODS = {
+    "vqc": run_vqc,
+    "ortools": run_ortools,
+    "nearest_truck": run_nearest_truck,
+    "random": run_random,
+}
+
+
+def route_distance(customers, depot, stop_ids):
+    """Closed tour length in km: depot -> stops in order -> depot."""
+    if not stop_ids:
+        return 0.0
+    path = np.vstack([np.asarray(depot, dtype=np.float64).reshape(1, 2),
+                      np.asarray(customers, dtype=np.float64)[stop_ids]])
+    return float(leg_distances(path, np.roll(path, -1, axis=0)).sum())
+
+
+def evaluate(customers, demands, capacity, depot, routes):
+    """Returns: dict distance, overloads (trucks over capacity), unserved customers"""
+    if routes is None:
+        return {"distance": None, "overloads": 0, "unserved": len(customers)}
+    served = sum(len(r) for r in routes)
+    return {
+        "distance": round(sum(route_distance(customers, depot, r) for r in routes), 3),
+        "overloads": sum(sum(demands[c] for c in r) > capacity for r in routes),
+        "unserved": len(customers) - served,
+    }
+
+
+def evaluate_instance(instance, methods=tuple(METHODS), seed=0, ortools_time_limit=ORTOOLS_TIME_LIMIT):
+    """
+    Run methods on one instance.
+    Returns: dict method -> {distance, overloads, unserved, seconds, routes}
+    """
+    customers, demands, num_vehicles, capacity, depot = _instance_args(instance)
+    out = {}
+    for name in methods:
+        kwargs = {"time_limit": ortools_time_limit} if name == "ortools" else {}
+        start = time.perf_counter()
+        routes = METHODS[name](customers, demands, num_vehicles, capacity, depot, seed, **kwargs)
+        seconds = time.perf_counter() - start
+        out[name] = dict(evaluate(customers, demands, capacity, depot, routes), seconds=seconds, routes=routes)
+    return out
+
+
+def _percentiles(values):
+    v = np.asarray(values, dtype=np.float64) * 1000
+    return {"p50": round(float(np.percentile(v, 50)), 3), "p90": round(float(np.percentile(v, 90)), 3),
+            "p99": round(float(np.percentile(v, 99)), 3), "max": round(float(v.max()), 3)}
+
+
+def _rss_probe(name, path, seed, ortools_time_limit):
+    """Child side of _peak_rss_mb: run name on the instances in path, then print this process's peak RSS in MB."""
+    with open(path) as f:
+        instances = json.load(f)
+    if name == "vqc":
+        warm_up()
+    for instance in instances:
+        evaluate_instance(instance, (name,), int(seed), float(ortools_time_limit))
+    try:
+        # Linux: VmHWM is this process's own high-water mark; ru_maxrss would
+        # also carry the (larger) peak of the benchmark process that spawned it
+        with open("/proc/self/status") as f:
+            print(next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 2 ** 10)
+    except (OSError, StopIteration):
+        import resource
+
+        per_mb = 2 ** 20 if sys.platform == "darwin" else 2 ** 10  # ru_maxrss is bytes on macOS, KB elsewhere
+        print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / per_mb)
+
+
+def _peak_rss_mb(name, instances, seed, ortools_time_limit):
+    """
+    Peak resident set size (MB) of a fresh interpreter that loads this module
+    and runs one method on instances. Unlike tracemalloc this counts native
+    memory (OR-Tools, NumPy, the model) and starts from cold caches.
+    Returns: float, or None if the probe failed (e.g. no resource module)
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(instances, f)
+    code = (f"import sys; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+            "import bench_suite; bench_suite._rss_probe(*sys.argv[1:])")
+    try:
+        probe = subprocess.run([sys.executable, "-c", code, name, f.name, str(seed), str(ortools_time_limit)],
+                               capture_output=True, text=True)
+    finally:
+        os.remove(f.name)
+    if probe.returncode != 0:
+        return None
+    return round(float(probe.stdout.strip().splitlines()[-1]), 3)
+
+
+def run_suite(instances, methods=tuple(METHODS), seed=0, ortools_time_limit=ORTOOLS_TIME_LIMIT,
+              memory_sample=MEMORY_SAMPLE):
+    """
+    Benchmark methods on a list of instances (dicts in the data/raw layout).
+    Returns: JSON-ready dict with config, per-method summary and per-instance rows
+    """
+    if "vqc" in methods:
+        start = time.perf_counter()
+        warm_up()
+        model_load_seconds = time.perf_counter() - start
+    else:
+        model_load_seconds = 0.0
+
+    rows = []
+    with telemetry.capture() as recorder:
+        for k, instance in enumerate(instances):
+            result = evaluate_instance(instance, methods, seed + k, ortools_time_limit)
+            rows.append({"instance": instance.get("instance_id", k), "customers": len(instance["customers"]),
+                         **{name: {key: r[key] for key in ("distance", "overloads", "unserved", "seconds")}
+                            for name, r in result.items()}})
+
+    summary = {}
+    for name in methods:
+        seconds = [row[name]["seconds"] for row in rows]
+        solved = [row for row in rows if row[name]["distance"] is not None]
+        gaps = [100 * (row[name]["distance"] / row["ortools"]["distance"] - 1)
+                for row in solved if "ortools" in row and row["ortools"]["distance"]]
+        summary[name] = {
+            "label": METHOD_NAMES[name],
+            "instances": len(rows),
+            "solved": len(solved),
+            "total_distance": round(sum(row[name]["distance"] for row in solved), 3),
+            "mean_gap_pct": round(float(np.mean(gaps)), 3) if gaps else None,
+            "overloads": int(sum(row[name]["overloads"] for row in rows)),
+            "overloaded_instances": sum(row[name]["overloads"] > 0 for row in rows),
+            "unserved": int(sum(row[name]["unserved"] for row in rows)),
+            "wall_seconds": round(sum(seconds), 4),
+            "latency_ms": _percentiles(seconds) if seconds else None,
+            "peak_rss_mb": _peak_rss_mb(name, instances[:memory_sample], seed, ortools_time_limit)
+            if memory_sample else None,
+        }
+
+    return {
+        "config": {"instances": len(instances), "seed": seed, "ortools_time_limit": ortools_time_limit,
+                   "model_load_seconds": round(model_load_seconds, 4)},
+        "methods": summary,
+        "stages": recorder.snapshot(),
+        "per_instance": rows,
+    }
+
+
+def load_instances(input_dir=INPUT_DIR, limit=None):
+    names = sorted(name for name in os.listdir(input_dir) if name.endswith(".json"))[:limit]
+    instances = []
+    for name in names:
+        with open(os.path.join(input_dir, name)) as f:
+            instances.append(json.load(f))
+    return instances
+
+
+def synthetic_instances(n_instances, n_customers=(5, 8), num_vehicles=3, vehicle_capacity=15, seed=42):
+    """Instances in the data/raw layout, from generate_data.generate_chunk."""
+    from generate_data import generate_chunk, VIJAYAWADA_BBOX
+
+    cols = generate_chunk(np.random.default_rng(seed), n_instances, n_customers, vehicle_capacity,
+                          num_vehicles, bbox=VIJAYAWADA_BBOX)
+    offsets = cols["offsets"]
+    return [{
+        "instance_id": k,
+        "depot": cols["depots"][k].astype(np.float64).tolist(),
+        "customers": cols["coords"][offsets[k]:offsets[k + 1]].astype(np.float64).tolist(),
+        "demands": cols["demands"][offsets[k]:offsets[k + 1]].tolist(),
+        "num_vehicles": int(cols["num_vehicles"][k]),
+        "vehicle_capacity": int(cols["vehicle_capacity"][k]),
+    } for k in range(n_instances)]
+
+
+def save_results(results, path=RESULTS_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark VQC, OR-Tools and baseline routing")
+    parser.add_argument("--source", choices=["raw", "synthetic"], default="raw",
+                        help=f"Instances from {INPUT_DIR} or freshly generated")
+    parser.add_argument("--instances", type=int, default=None, help="Number of instances (default: all raw / 50)")
+    parser.add_argument("--customers", type=int, nargs="+", default=[5, 8],
+                        help="Synthetic customers per instance: N, or MIN MAX")
+    parser.add_argument("--vehicles", type=int, default=3,
+                        help="Synthetic fleet size (0: sized to each instance's demand)")
+    parser.add_argument("--methods", nargs="+", choices=list(METHODS), default=list(METHODS))
+    parser.add_argument("--ortools-time", type=float, default=ORTOOLS_TIME_LIMIT)
+    parser.add_argument("--memory-sample", type=int, default=MEMORY_SAMPLE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--trace", default=None, help="Also write a Chrome trace-event JSON file here")
+    parser.add_argument("--metrics", default=None, help="Also write a Prometheus text snapshot here")
+    args = parser.parse_args(argv)
+    if args.trace or args.metrics:
+        telemetry.enable()
+
+    if args.source == "raw":
+        instances = load_instances(INPUT_DIR, args.instances)
+    else:
+        customers = args.customers[0] if len(args.customers) == 1 else tuple(args.customers[:2])
+        instances = synthetic_instances(args.instances or 50, customers, args.vehicles or None, seed=args.seed)
+    results = run_suite(instances, args.methods, args.seed, args.ortools_time, args.memory_sample)
+    save_results(results, args.output)
+    for name, m in results["methods"].items():
+        gap = "n/a" if m["mean_gap_pct"] is None else f"{m['mean_gap_pct']:+.1f}%"
+        p50 = "n/a" if m["latency_ms"] is None else f"{m['latency_ms']['p50']:.1f} ms"
+        print(f"{m['label']:<20} {m['total_distance']:>10.1f} km  gap {gap:>7}  "
+              f"overloads {m['overloads']:>3}  p50 {p50}")
+    print(f"✅ Benchmark results saved to {args.output}")
+    if args.trace:
+        telemetry.save_chrome_trace(args.trace)
+        print(f"✅ Trace saved to {args.trace}")
+    if args.metrics:
+        telemetry.save_prometheus(args.metrics)
+        print(f"✅ Metrics saved to {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
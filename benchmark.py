@@ -1,16 +1,25 @@
 # benchmark.py
 """
-Dynamic benchmarking: Uses real-time results from current run.
+Benchmark display: charts and reports for results measured by bench_suite.py.
+Nothing is computed here; run `python bench_suite.py` to (re)measure.
 Generates charts and saves UTF-8-safe text report.
 """
 
+import json
 import matplotlib.pyplot as plt
 import streamlit as st
 import os
 
-# Ensure reports directory exists
 REPORT_DIR = "data/reports"
-os.makedirs(REPORT_DIR, exist_ok=True)
+RESULTS_FILE = os.path.join(REPORT_DIR, "benchmark.json")  # written by bench_suite.py
+
+
+def load_results(path=RESULTS_FILE):
+    """Benchmark results written by bench_suite.py, or None if there are none yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
 
 def plot_distance_comparison(methods, distances):
     """Bar chart: Total Distance Comparison"""
@@ -51,31 +60,39 @@ def plot_overload_comparison(methods, overloads):
     st.pyplot(fig)
     return fig
 
-def generate_summary(qroutenet_distance, qroutenet_overloads, num_vehicles, capacity, n_customers):
-    """Display dynamic performance summary"""
-    # Simulate baselines based on Q-RouteNet result
-    optimal = max(50.8, qroutenet_distance * 0.95)
-    nearest_truck = qroutenet_distance * 1.3
-    random_assign = qroutenet_distance * 1.4
-
+def generate_summary(results):
+    """Display the measured performance summary"""
+    methods = results["methods"]
+    config = results["config"]
+    lines = [f"- **Instances**: {config['instances']} (OR-Tools limit {config['ortools_time_limit']}s each)"]
+    for m in methods.values():
+        gap = "gap n/a" if m["mean_gap_pct"] is None else f"{m['mean_gap_pct']:+.1f}% vs OR-Tools"
+        latency = ("latency n/a" if m["latency_ms"] is None
+                   else f"p50 {m['latency_ms']['p50']:.1f} ms, p99 {m['latency_ms']['p99']:.1f} ms")
+        peak = "n/a" if m.get("peak_rss_mb") is None else f"{m['peak_rss_mb']:.1f} MB"
+        lines.append(f"- **{m['label']}**: {m['total_distance']:.1f} km, {gap}, {m['overloads']} overloads, "
+                     f"{latency}, peak RSS {peak}")
     st.markdown("### 🏁 Performance Summary")
-    st.markdown(f"""
-    - **Q-RouteNet Distance**: {qroutenet_distance:.1f} km
-    - **Overloads**: {qroutenet_overloads}
-    - **Fleet Used**: {num_vehicles} trucks × {capacity} capacity
-    - **Customers Served**: {n_customers}
-    - **Efficiency**: {(optimal / qroutenet_distance * 100):.1f}% of optimal
-    """)
-    st.success("✅ Q-RouteNet balances speed, accuracy, and feasibility!")
+    st.markdown("\n".join(lines))
+
+    stages = results.get("stages", {}).get("spans", {})
+    if stages:
+        st.markdown("### ⏱️ Where the Time Goes")
+        st.table([{"Stage": name, "Calls": s["calls"], "Total (ms)": round(s["seconds"] * 1000, 1),
+                   "Mean (ms)": round(s["seconds"] * 1000 / s["calls"], 3)}
+                  for name, s in sorted(stages.items(), key=lambda kv: -kv[1]["seconds"])])
 
     return {
-        "METHODS": ["Q-RouteNet (QML)", "OR-Tools (Optimal)", "Nearest Truck", "Random Assignment"],
-        "DISTANCES": [qroutenet_distance, optimal, nearest_truck, random_assign],
-        "OVERLOADS": [qroutenet_overloads, 0, 2, 3]
+        "METHODS": [m["label"] for m in methods.values()],
+        "DISTANCES": [m["total_distance"] for m in methods.values()],
+        "OVERLOADS": [m["overloads"] for m in methods.values()],
+        "LATENCY": [m["latency_ms"] for m in methods.values()],
+        "STAGES": stages,
     }
 
 def save_text_report(metrics, num_vehicles, capacity):
     """Save benchmark results to a text file using UTF-8 encoding"""
+    os.makedirs(REPORT_DIR, exist_ok=True)
     report_path = os.path.join(REPORT_DIR, "benchmark_report.txt")
     with open(report_path, "w", encoding="utf-8") as f:
         f.write("Q-RouteNet Benchmark Report\n")
@@ -86,6 +103,15 @@ def save_text_report(metrics, num_vehicles, capacity):
             f.write(f"{method}:\n")
             f.write(f"  - Total Distance: {metrics['DISTANCES'][i]:.1f} km\n")
             f.write(f"  - Overloads: {metrics['OVERLOADS'][i]}\n")
+            latency = metrics["LATENCY"][i]
+            if latency:
+                f.write(f"  - Latency: p50 {latency['p50']:.1f} ms, p90 {latency['p90']:.1f} ms, "
+                        f"p99 {latency['p99']:.1f} ms, max {latency['max']:.1f} ms\n")
+            f.write("\n")
+        if metrics["STAGES"]:
+            f.write("Stage Timings:\n")
+            for name, s in sorted(metrics["STAGES"].items(), key=lambda kv: -kv[1]["seconds"]):
+                f.write(f"  - {name}: {s['seconds'] * 1000:.1f} ms over {s['calls']} calls\n")
             f.write("\n")
         f.write("Q-RouteNet: Quantum learning for smart logistics.\n")
     st.info(f"📄 Report saved to {report_path}")
@@ -94,6 +120,7 @@ def save_pdf_report(figures):
     """Optional: Save a simple PDF using matplotlib"""
     try:
         from matplotlib.backends.backend_pdf import PdfPages
+        os.makedirs(REPORT_DIR, exist_ok=True)
         pdf_path = os.path.join(REPORT_DIR, "benchmark_report.pdf")
         with PdfPages(pdf_path) as pdf:
             for fig in figures:
@@ -104,23 +131,21 @@ def save_pdf_report(figures):
         st.warning(f"PDF generation failed: {e}")
 
 # --- Main Execution Block ---
-def run_benchmark(qroutenet_result):
-    """Run all benchmarks using dynamic input"""
+def run_benchmark(results_path=RESULTS_FILE, num_vehicles=3, capacity=15):
+    """Display benchmark results measured by bench_suite.py"""
     st.header("📊 Q-RouteNet vs Classical Methods")
 
-    # Generate dynamic metrics
-    metrics = generate_summary(
-        qroutenet_result["total_distance"],
-        qroutenet_result["overloads"],
-        qroutenet_result["num_vehicles"],
-        qroutenet_result["capacity"],
-        qroutenet_result["n_customers"]
-    )
+    results = load_results(results_path)
+    if results is None:
+        st.warning(f"No benchmark results at {results_path}; run `python bench_suite.py` first.")
+        return
+
+    metrics = generate_summary(results)
 
     # Plot charts
     fig1 = plot_distance_comparison(metrics["METHODS"], metrics["DISTANCES"])
     fig2 = plot_overload_comparison(metrics["METHODS"], metrics["OVERLOADS"])
 
     # Save reports
-    save_text_report(metrics, qroutenet_result["num_vehicles"], qroutenet_result["capacity"])
-    save_pdf_report([fig1, fig2])
\ No newline at end of file
+    save_text_report(metrics, num_vehicles, capacity)
+    save_pdf_report([fig1, fig2])
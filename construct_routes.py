@@ -4,67 +4,101 @@ Build delivery routes from QML predictions.
 Fixes overloads and ensures all trucks are used if needed.
 """
 
-from ortools.constraint_solver import routing_enums_pb2, pywrapcp
 import numpy as np
+from distance import distance_matrix, leg_distances
+from local_search import improve_tour, tour_length
+from exact_tsp import held_karp, MAX_STOPS
+from repair import repair_assignments
+from solve_labels import solve_cvrp_warm
+from spatial_index import nearest_neighbor_order, project
+from telemetry import traced
+
+DEPOT = [16.5062, 80.6480]  # Vijayawada Railway Station
+LOCAL_SEARCH_BUDGET = 0.05  # seconds of 2-opt / Or-opt per truck
+EXACT_TSP_MAX_STOPS = 9  # trucks with at most this many stops get Held-Karp tours (< 1 ms each)
+MATRIX_MAX_STOPS = 2000  # larger trucks skip the distance matrix, so get no local search either
+HYBRID_TIME_LIMIT = 0.5  # seconds of OR-Tools guided local search from the QML seed
+
+
+def nearest_neighbor_tour(dist_matrix):
+    """Nearest-neighbour tour over node indices, starting at the depot (0)."""
+    n = len(dist_matrix)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    route = [0]
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist_matrix[route[-1]])
+        nearest = int(np.argmin(row))
+        visited[nearest] = True
+        route.append(nearest)
+    return route
+
 
-def solve_tsp_for_truck(customers, depot=(0, 0)):
+def _spatial_nn_order(customers, depot):
+    """
+    Nearest-neighbour visiting order of customers from the depot, via the grid
+    index over an equirectangular projection about the depot's latitude. Only
+    used above MATRIX_MAX_STOPS: it can break near-ties differently from
+    nearest_neighbor_tour on the distance matrix.
+    """
+    return nearest_neighbor_order(project(customers, depot[0]), project([depot], depot[0])[0])
+
+
+@traced("solve_tsp_for_truck")
+def _solve_truck(customers, depot, local_search=False, time_budget=LOCAL_SEARCH_BUDGET,
+                 exact_threshold=EXACT_TSP_MAX_STOPS):
+    saved, seconds = 0.0, 0.0
+    if len(customers) > MATRIX_MAX_STOPS:
+        order = _spatial_nn_order(customers, depot)
+        stops = np.asarray(customers, dtype=np.float64)[order]
+        path = np.vstack([np.asarray(depot, dtype=np.float64).reshape(1, 2), stops])
+        total_distance = float(leg_distances(path, np.roll(path, -1, axis=0)).sum())
+        return order, total_distance, saved, seconds
+
+    dist_matrix = distance_matrix(customers, depot)
+    if len(customers) <= min(exact_threshold, MAX_STOPS):
+        route, total_distance = held_karp(dist_matrix)
+        return [i-1 for i in route[1:]], total_distance, saved, seconds
+
+    route = nearest_neighbor_tour(dist_matrix)
+    if local_search:
+        route, saved, seconds = improve_tour(route, dist_matrix, time_budget)
+    total_distance = tour_length(route, dist_matrix)
+    return [i-1 for i in route[1:]], total_distance, saved, seconds
+
+
+def solve_tsp_for_truck(customers, depot=(0, 0), local_search=False, time_budget=LOCAL_SEARCH_BUDGET,
+                        exact_threshold=0):
     """
-    Solve TSP for one truck using nearest neighbor.
+    Solve TSP for one truck using nearest neighbor on the distance matrix,
+    optionally improved with 2-opt / Or-opt within time_budget seconds.
+    Stop sets no larger than exact_threshold are solved exactly (Held-Karp).
+    Above MATRIX_MAX_STOPS no distance matrix is built: the nearest-neighbour
+    order comes from the spatial grid index and local_search is ignored.
     Returns: route (list of customer coordinates), total distance (km)
     """
     if len(customers) == 0:
         return [], 0.0
+    order, total_distance, _, _ = _solve_truck(customers, depot, local_search, time_budget, exact_threshold)
+    return [customers[i] for i in order], total_distance
 
-    locations = [depot] + customers
-    n = len(locations)
-    dist_matrix = np.zeros((n, n))
-
-    # Compute Euclidean distance with km approximation
-    for i in range(n):
-        for j in range(n):
-            dx = (locations[i][0] - locations[j][0]) * 111  # ~km per degree latitude
-            dy = (locations[i][1] - locations[j][1]) * 111 * np.cos(np.radians(locations[i][0]))
-            dist_matrix[i][j] = np.hypot(dx, dy)
-
-    # Nearest Neighbor TSP
-    route = [0]  # Start at depot
-    unvisited = list(range(1, n))
-    total_distance = 0.0
-
-    while unvisited:
-        last = route[-1]
-        nearest = min(unvisited, key=lambda u: dist_matrix[last][u])
-        total_distance += dist_matrix[last][nearest]
-        route.append(nearest)
-        unvisited.remove(nearest)
-
-    total_distance += dist_matrix[route[-1]][0]  # Return to depot
-    return [customers[i-1] for i in route[1:-1] + [route[-1]]], total_distance
 
-
-def validate_and_fix_assignments(customers, demands, assignments, vehicle_capacity=15, num_vehicles=3):
+@traced()
+def validate_and_fix_assignments(customers, demands, assignments, vehicle_capacity=15, num_vehicles=3,
+                                 depot=DEPOT):
     """
     Ensure no truck exceeds capacity.
-    Reassign customers if needed.
+    Reassign customers if needed, cheapest estimated insertion first
+    (see repair.repair_assignments; use that directly for the feasibility flag).
     """
-    loads = [0] * num_vehicles
-    for i, truck_id in enumerate(assignments):
-        if 0 <= truck_id < num_vehicles:
-            loads[truck_id] += demands[i]
-
-    # Reassign overloaded customers
-    for i, truck_id in enumerate(assignments):
-        if loads[truck_id] > vehicle_capacity:
-            for new_truck in range(num_vehicles):
-                if new_truck != truck_id and loads[new_truck] + demands[i] <= vehicle_capacity:
-                    assignments[i] = new_truck
-                    loads[truck_id] -= demands[i]
-                    loads[new_truck] += demands[i]
-                    break
+    assignments, _ = repair_assignments(customers, demands, assignments, vehicle_capacity, num_vehicles, depot)
     return assignments
 
 
-def build_routes(customers, demands, assignments, vehicle_capacity=15, num_vehicles=3):
+@traced()
+def build_routes(customers, demands, assignments, vehicle_capacity=15, num_vehicles=3,
+                 local_search=False, time_budget=LOCAL_SEARCH_BUDGET, exact_threshold=EXACT_TSP_MAX_STOPS,
+                 depot=DEPOT):
     """
     Build final delivery routes from QML predictions.
     Args:
@@ -73,26 +107,34 @@ def build_routes(customers, demands, assignments, vehicle_capacity=15, num_vehic
         assignments: list of truck IDs (from QML model)
         vehicle_capacity: int
         num_vehicles: int
+        local_search: run 2-opt / Or-opt on each truck's tour (not done for
+            trucks above MATRIX_MAX_STOPS stops, which keep the grid-index
+            nearest-neighbour tour)
+        time_budget: wall-clock seconds of local search per truck
+        exact_threshold: trucks with at most this many stops get an optimal
+            Held-Karp tour instead (0 disables; capped at exact_tsp.MAX_STOPS)
+        depot: [lat, lon] every truck starts and ends at
     Returns:
         routes: list of route dicts
         total_distance: float
     """
     # Validate and fix overloads
-    assignments = validate_and_fix_assignments(customers, demands, assignments, vehicle_capacity, num_vehicles)
+    assignments = validate_and_fix_assignments(customers, demands, assignments, vehicle_capacity, num_vehicles, depot)
 
     # Group customers by truck
     vehicle_customers = [[] for _ in range(num_vehicles)]
     vehicle_demands = [[] for _ in range(num_vehicles)]
+    vehicle_ids = [[] for _ in range(num_vehicles)]
 
     for i, truck_id in enumerate(assignments):
         if 0 <= truck_id < num_vehicles:
             vehicle_customers[truck_id].append(customers[i])
             vehicle_demands[truck_id].append(demands[i])
+            vehicle_ids[truck_id].append(i)
 
     # Build routes
     routes = []
     total_distance = 0.0
-    depot = [16.5062, 80.6480]  # Vijayawada Railway Station
 
     for vid in range(num_vehicles):
         cust_list = vehicle_customers[vid]
@@ -100,16 +142,70 @@ def build_routes(customers, demands, assignments, vehicle_capacity=15, num_vehic
         if not cust_list:
             continue
 
-        route_stops, distance = solve_tsp_for_truck(cust_list, depot)
+        order, distance, saved, seconds = _solve_truck(
+            cust_list, depot, local_search, time_budget, exact_threshold)
         total_distance += distance
 
-        routes.append({
+        route = {
             "vehicle_id": vid,
             "customers": cust_list,
-            "route": route_stops,
+            "route": [cust_list[i] for i in order],
+            "stop_ids": [vehicle_ids[vid][i] for i in order],
             "load": load,
             "capacity": vehicle_capacity,
             "distance": round(distance, 2)
+        }
+        if local_search:
+            route["distance_saved"] = round(saved, 2)
+            route["improve_seconds"] = round(seconds, 4)
+        routes.append(route)
+
+    return routes, round(total_distance, 2)
+
+
+@traced()
+def build_routes_hybrid(customers, demands, assignments, vehicle_capacity=15, num_vehicles=3,
+                        time_limit=HYBRID_TIME_LIMIT, depot=DEPOT):
+    """
+    QML-seeded OR-Tools routing: the repaired, locally improved routes from
+    build_routes are loaded as OR-Tools' initial solution and refined with
+    guided local search for time_limit seconds.
+    Args:
+        same as build_routes, plus
+        time_limit: seconds of guided local search
+    Returns:
+        routes: list of route dicts (the seed routes if OR-Tools finds nothing better)
+        total_distance: float
+    """
+    seed_routes, seed_distance = build_routes(customers, demands, assignments, vehicle_capacity,
+                                              num_vehicles, local_search=True, depot=depot)
+
+    initial = [[] for _ in range(num_vehicles)]
+    for route in seed_routes:
+        initial[route["vehicle_id"]] = route["stop_ids"]
+    solved = solve_cvrp_warm(customers, demands, initial, num_vehicles, vehicle_capacity,
+                             depot=depot, time_limit=time_limit)
+    if solved is None:
+        return seed_routes, seed_distance
+
+    dist = distance_matrix(customers, depot)
+    routes = []
+    total_distance = 0.0
+    for vid, stop_ids in enumerate(solved):
+        if not stop_ids:
+            continue
+        distance = tour_length([0] + [c + 1 for c in stop_ids], dist)
+        total_distance += distance
+        routes.append({
+            "vehicle_id": vid,
+            "customers": [customers[c] for c in sorted(stop_ids)],
+            "route": [customers[c] for c in stop_ids],
+            "stop_ids": stop_ids,
+            "load": sum(demands[c] for c in stop_ids),
+            "capacity": vehicle_capacity,
+            "distance": round(distance, 2)
         })
 
-    return routes, round(total_distance, 2)
\ No newline at end of file
+    if total_distance >= seed_distance:
+        return seed_routes, seed_distance
+    return routes, round(total_distance, 2)
@@ -0,0 +1,136 @@
+# dataset_store.py
+"""
+Sharded on-disk store for labelled customer rows.
+solve_labels.py appends (features, labels) per instance; preprocess.py reads
+the shards back as memory-mapped chunks, so neither holds the corpus in RAM.
+"""
+
+import json
+import os
+import shutil
+import numpy as np
+
+STORE_DIR = "data/processed/labeled_store"
+MANIFEST_FILE = "manifest.json"
+SHARD_ROWS = 1 << 18  # rows buffered before a shard is flushed
+NUM_FEATURES = 3  # lat, lon, demand
+
+PREPROCESSED_X = "data/processed/preprocessed_X.npy"
+PREPROCESSED_Y = "data/processed/preprocessed_y.npy"
+LEGACY_PREPROCESSED = "data/processed/preprocessed_data.joblib"
+
+
+class LabelStore:
+    """
+    Append-only writer / memory-mapped reader over features_*.npy (float32,
+    rows x 3) and labels_*.npy (int32) shard pairs, plus a JSON manifest.
+    """
+
+    def __init__(self, root=STORE_DIR, shard_rows=SHARD_ROWS):
+        self.root = root
+        self.shard_rows = shard_rows
+        self._features = []
+        self._labels = []
+        self._buffered = 0
+        self.shards = []
+        self.instances = 0
+        manifest = os.path.join(root, MANIFEST_FILE)
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                data = json.load(f)
+            self.shards = data["shards"]
+            self.instances = data.get("instances", 0)
+
+    @classmethod
+    def create(cls, root=STORE_DIR, shard_rows=SHARD_ROWS):
+        """Start an empty store at root, removing any previous shards."""
+        os.makedirs(root, exist_ok=True)
+        for name in os.listdir(root):
+            if name.endswith(".npy") or name == MANIFEST_FILE:
+                os.remove(os.path.join(root, name))
+        return cls(root, shard_rows)
+
+    @staticmethod
+    def exists(root=STORE_DIR):
+        return os.path.exists(os.path.join(root, MANIFEST_FILE))
+
+    def __len__(self):
+        return sum(s["rows"] for s in self.shards) + self._buffered
+
+    def append(self, features, labels, instances=1):
+        features = np.asarray(features, dtype=np.float32).reshape(-1, NUM_FEATURES)
+        labels = np.asarray(labels, dtype=np.int32).reshape(-1)
+        if len(features) != len(labels):
+            raise ValueError(f"{len(features)} feature rows but {len(labels)} labels")
+        self._features.append(features)
+        self._labels.append(labels)
+        self._buffered += len(labels)
+        self.instances += instances
+        if self._buffered >= self.shard_rows:
+            self.flush()
+
+    def flush(self):
+        os.makedirs(self.root, exist_ok=True)
+        if self._buffered:
+            idx = len(self.shards)
+            feat_name, label_name = f"features_{idx:05d}.npy", f"labels_{idx:05d}.npy"
+            np.save(os.path.join(self.root, feat_name), np.concatenate(self._features))
+            np.save(os.path.join(self.root, label_name), np.concatenate(self._labels))
+            self.shards.append({"features": feat_name, "labels": label_name, "rows": self._buffered})
+            self._features, self._labels, self._buffered = [], [], 0
+        with open(os.path.join(self.root, MANIFEST_FILE), "w") as f:
+            json.dump({"shards": self.shards, "instances": self.instances}, f)
+
+    close = flush
+
+    def keep_rows(self, ranges, instances):
+        """
+        Rewrite the store with only the rows in ranges (sorted, disjoint
+        [start, end) pairs), streaming one shard at a time through a
+        sibling directory that then replaces root.
+        Returns: the rewritten LabelStore
+        """
+        merged = []
+        for start, end in ranges:
+            if merged and merged[-1][1] == start:
+                merged[-1][1] = end
+            elif end > start:
+                merged.append([start, end])
+        tmp = self.root.rstrip("/\\") + ".tmp"
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
+        out = LabelStore.create(tmp, self.shard_rows)
+        offset = 0
+        for X, y in self.iter_chunks():
+            for start, end in merged:
+                lo, hi = max(start, offset) - offset, min(end, offset + len(y)) - offset
+                if lo < hi:
+                    out.append(X[lo:hi], y[lo:hi], instances=0)
+            offset += len(y)
+        out.instances = instances
+        out.close()
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+        os.replace(tmp, self.root)
+        return LabelStore(self.root, self.shard_rows)
+
+    def iter_chunks(self, chunk_rows=SHARD_ROWS):
+        """Yield (features, labels) memory-mapped slices of at most chunk_rows rows."""
+        for shard in self.shards:
+            X = np.load(os.path.join(self.root, shard["features"]), mmap_mode="r")
+            y = np.load(os.path.join(self.root, shard["labels"]), mmap_mode="r")
+            for start in range(0, len(y), chunk_rows):
+                yield X[start:start + chunk_rows], y[start:start + chunk_rows]
+
+
+def load_preprocessed():
+    """
+    Scaled training data as (X, y): memory-mapped arrays written by
+    preprocess.py, or the older in-memory joblib dict if that is all there is.
+    """
+    if os.path.exists(PREPROCESSED_X):
+        return np.load(PREPROCESSED_X, mmap_mode="r"), np.load(PREPROCESSED_Y, mmap_mode="r")
+    import joblib
+
+    data = joblib.load(LEGACY_PREPROCESSED)
+    return data["X"], data["y"]
@@ -0,0 +1,259 @@
+# decomposition.py
+"""
+Cluster-first, route-second CVRP for instances with thousands of customers.
+Customers are split geographically (sweep or capacity-aware k-means) into
+partitions small enough for the existing OR-Tools path, the partitions are
+solved in parallel worker processes, and neighbouring partitions are then
+re-solved pairwise so routes can trade customers across partition borders.
+Every subproblem has a bounded size, so total work grows linearly with the
+number of customers.
+"""
+
+import argparse
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from distance import distance_matrix, point_distances
+from local_search import tour_length
+from solve_labels import solve_cvrp_anytime
+
+DEPOT = [16.5062, 80.6480]  # Vijayawada Railway Station
+VEHICLES_PER_PARTITION = 3  # matches the solve_cvrp / build_routes defaults
+FILL = 0.9  # share of a partition's fleet capacity its demand may use
+PARTITION_TIME_LIMIT = 0.3  # seconds per partition (the anytime solver stops earlier)
+KMEANS_ITERATIONS = 10
+CHUNK_SIZE = 16  # partitions handed to a worker per round-trip
+
+
+def _angles(points, depot):
+    dy = points[:, 0] - depot[0]
+    dx = (points[:, 1] - depot[1]) * np.cos(np.radians(depot[0]))
+    return np.arctan2(dy, dx)
+
+
+def _partition_limit(vehicle_capacity, vehicles_per_partition):
+    return max(1, int(vehicles_per_partition * vehicle_capacity * FILL))
+
+
+def sweep_partition(customers, demands, depot=DEPOT, vehicle_capacity=15,
+                    vehicles_per_partition=VEHICLES_PER_PARTITION):
+    """
+    Sort customers by polar angle around the depot, starting after the widest
+    empty sector, and cut the sweep whenever the next customer would push a
+    partition past its demand limit.
+    Returns: list of arrays of customer indices
+    """
+    points = np.asarray(customers, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return []
+    angles = _angles(points, np.asarray(depot, dtype=np.float64))
+    order = np.argsort(angles, kind="stable")
+    gaps = np.diff(np.concatenate([angles[order], angles[order[:1]] + 2 * np.pi]))
+    order = np.roll(order, -int(np.argmax(gaps) + 1) % len(order))
+
+    limit = _partition_limit(vehicle_capacity, vehicles_per_partition)
+    demand = np.asarray(demands, dtype=np.int64)[order]
+    partitions, start, load = [], 0, 0
+    for i, d in enumerate(demand):
+        if load + d > limit and i > start:
+            partitions.append(order[start:i])
+            start, load = i, 0
+        load += d
+    partitions.append(order[start:])
+    return partitions
+
+
+def kmeans_partition(customers, demands, depot=DEPOT, vehicle_capacity=15,
+                     vehicles_per_partition=VEHICLES_PER_PARTITION, iterations=KMEANS_ITERATIONS):
+    """
+    Capacity-aware k-means seeded from the sweep partitions. Each iteration
+    assigns customers to their nearest centroid that still has room, taking
+    the customers with the most to lose (largest regret between their two
+    nearest centroids) first, then moves centroids to the partition means.
+    Returns: list of arrays of customer indices (empty partitions dropped)
+    """
+    points = np.asarray(customers, dtype=np.float64).reshape(-1, 2)
+    demand = np.asarray(demands, dtype=np.int64)
+    seeds = sweep_partition(customers, demands, depot, vehicle_capacity, vehicles_per_partition)
+    if len(seeds) <= 1:
+        return seeds
+    limit = _partition_limit(vehicle_capacity, vehicles_per_partition)
+    centroids = np.array([points[p].mean(axis=0) for p in seeds])
+    labels = np.empty(len(points), dtype=np.int64)
+    for i, p in enumerate(seeds):
+        labels[p] = i
+
+    for _ in range(iterations):
+        dist = point_distances(points, centroids)
+        ranked = np.argsort(dist, axis=1)
+        nearest = np.take_along_axis(dist, ranked[:, :2], axis=1)
+        regret = nearest[:, 1] - nearest[:, 0]
+        loads = np.zeros(len(centroids), dtype=np.int64)
+        new_labels = np.empty_like(labels)
+        for i in np.argsort(-regret, kind="stable"):
+            for c in ranked[i]:
+                if loads[c] + demand[i] <= limit:
+                    break
+            else:
+                c = int(np.argmin(loads))  # Nowhere fits: least-loaded partition
+            new_labels[i] = c
+            loads[c] += demand[i]
+        if (new_labels == labels).all():
+            break
+        labels = new_labels
+        for c in range(len(centroids)):
+            members = labels == c
+            if members.any():
+                centroids[c] = points[members].mean(axis=0)
+
+    partitions = [np.flatnonzero(labels == c) for c in range(len(centroids))]
+    partitions = [p for p in partitions if len(p)]
+    # Keep neighbouring partitions adjacent in the list, as the sweep does
+    depot = np.asarray(depot, dtype=np.float64)
+    angles = _angles(np.array([points[p].mean(axis=0) for p in partitions]), depot)
+    return [partitions[i] for i in np.argsort(angles, kind="stable")]
+
+
+PARTITIONERS = {"sweep": sweep_partition, "kmeans": kmeans_partition}
+
+
+def _solve_subproblem(task):
+    """Worker entry point: (customers, demands, num_vehicles, capacity, depot, time_limit, initial_routes)."""
+    customers, demands, num_vehicles, capacity, depot, time_limit, initial_routes = task
+    result = solve_cvrp_anytime(customers, demands, num_vehicles, capacity, depot, time_limit, initial_routes)
+    while result is None and initial_routes is None and num_vehicles < len(customers):
+        # Demand fits but the bin packing does not: allow one more truck
+        num_vehicles += 1
+        result = solve_cvrp_anytime(customers, demands, num_vehicles, capacity, depot, time_limit)
+    return result
+
+
+def _route_km(points, depot, route):
+    if not route:
+        return 0.0
+    dist = distance_matrix(points[route].tolist(), depot)
+    return tour_length(np.arange(len(route) + 1), dist)
+
+
+def solve_decomposed(customers, demands, vehicle_capacity=15, depot=DEPOT, method="sweep",
+                     vehicles_per_partition=VEHICLES_PER_PARTITION, time_limit=PARTITION_TIME_LIMIT,
+                     polish=True, workers=None):
+    """
+    Solve a large CVRP with as many trucks as the demand needs.
+    Args:
+        customers: list of [lat, lon]
+        demands: list of int
+        vehicle_capacity: int
+        depot: [lat, lon]
+        method: "sweep" or "kmeans"
+        vehicles_per_partition: trucks each partition is sized for
+        time_limit: seconds per partition solve (and per border polish)
+        polish: re-solve neighbouring partition pairs after stitching
+        workers: solver processes (default: all cores; 1 solves in-process)
+    Returns:
+        routes: list of route dicts (vehicle_id, customers, route, stop_ids,
+            load, capacity, distance), as from construct_routes.build_routes
+        total_distance: float (km)
+    """
+    points = np.asarray(customers, dtype=np.float64).reshape(-1, 2)
+    demand = np.asarray(demands, dtype=np.int64)
+    if (demand > vehicle_capacity).any():
+        raise ValueError(f"a customer's demand exceeds the vehicle capacity of {vehicle_capacity}")
+    depot = [float(depot[0]), float(depot[1])]
+    partitions = PARTITIONERS[method](points, demand, depot, vehicle_capacity, vehicles_per_partition)
+
+    def task(ids, initial_routes=None, num_vehicles=None):
+        if num_vehicles is None:
+            num_vehicles = max(1, math.ceil(demand[ids].sum() / vehicle_capacity))
+        return (points[ids].tolist(), demand[ids].tolist(), num_vehicles, vehicle_capacity,
+                depot, time_limit, initial_routes)
+
+    pool = None if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    run = map if pool is None else (lambda fn, tasks: pool.map(fn, tasks, chunksize=CHUNK_SIZE))
+    try:
+        results = list(run(_solve_subproblem, [task(ids) for ids in partitions]))
+        for ids, result in zip(partitions, results):
+            if result is None:
+                raise RuntimeError(f"no solution for a partition of {len(ids)} customers")
+        # Partition routes as lists of global customer ids
+        routes = [[[int(ids[c]) for c in r] for r in result["routes"] if r]
+                  for ids, result in zip(partitions, results)]
+        costs = [sum(_route_km(points, depot, r) for r in part) for part in routes]
+
+        if polish:
+            # Even pairs (0,1), (2,3), ... then odd pairs (1,2), (3,4), ...:
+            # the pairs within a round are disjoint, so each round runs in parallel
+            for offset in (0, 1):
+                pairs, tasks = [], []
+                for i in range(offset, len(partitions) - 1, 2):
+                    ids = np.array([c for r in routes[i] + routes[i + 1] for c in r], dtype=np.int64)
+                    if len(ids) == 0:
+                        continue
+                    local = {int(c): k for k, c in enumerate(ids)}
+                    seed = [[local[c] for c in r] for r in routes[i] + routes[i + 1]]
+                    pairs.append((i, i + 1))
+                    tasks.append((ids, task(ids, seed, len(seed))))
+                for (i, j), (ids, _), result in zip(pairs, tasks, run(_solve_subproblem, [t for _, t in tasks])):
+                    if result is None:
+                        continue
+                    merged = [[int(ids[c]) for c in r] for r in result["routes"] if r]
+                    merged_costs = [_route_km(points, depot, r) for r in merged]
+                    if sum(merged_costs) >= costs[i] + costs[j] - 1e-9:
+                        continue
+                    # Hand each route back to the partition most of its stops came from,
+                    # so the next round still pairs geographic neighbours
+                    from_i = {c for r in routes[i] for c in r}
+                    routes[i], routes[j], costs[i], costs[j] = [], [], 0.0, 0.0
+                    for r, cost in zip(merged, merged_costs):
+                        k = i if 2 * sum(c in from_i for c in r) >= len(r) else j
+                        routes[k].append(r)
+                        costs[k] += cost
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    out, total_distance = [], 0.0
+    for stop_ids in (r for part in routes for r in part):
+        distance = _route_km(points, depot, stop_ids)
+        total_distance += distance
+        out.append({
+            "vehicle_id": len(out),
+            "customers": [customers[c] for c in sorted(stop_ids)],
+            "route": [customers[c] for c in stop_ids],
+            "stop_ids": stop_ids,
+            "load": int(demand[stop_ids].sum()),
+            "capacity": vehicle_capacity,
+            "distance": round(distance, 2)
+        })
+    return out, round(total_distance, 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster-first, route-second CVRP for large instances")
+    parser.add_argument("instance", help="JSON file with customers and demands (and optionally vehicle_capacity)")
+    parser.add_argument("--method", choices=sorted(PARTITIONERS), default="sweep")
+    parser.add_argument("--vehicles-per-partition", type=int, default=VEHICLES_PER_PARTITION)
+    parser.add_argument("--time-limit", type=float, default=PARTITION_TIME_LIMIT)
+    parser.add_argument("--no-polish", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="Write the routes as JSON here")
+    args = parser.parse_args(argv)
+
+    with open(args.instance) as f:
+        data = json.load(f)
+    start = time.perf_counter()
+    routes, total = solve_decomposed(
+        data["customers"], data["demands"], data.get("vehicle_capacity", 15),
+        data.get("depot", DEPOT), args.method, args.vehicles_per_partition,
+        args.time_limit, not args.no_polish, args.workers)
+    print(f"✅ {len(data['customers'])} customers, {len(routes)} trucks, {total} km "
+          f"in {time.perf_counter() - start:.1f}s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"routes": routes, "total_distance": total}, f)
+
+
+if __name__ == "__main__":
+    main()
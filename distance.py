@@ -0,0 +1,120 @@
+# distance.py
+"""
+Shared distance-matrix engine for the labelling and routing code.
+Builds full matrices with NumPy broadcasting instead of per-cell Python loops.
+"""
+
+from collections import OrderedDict
+import numpy as np
+from telemetry import count, span
+
+KM_PER_DEGREE = 111
+EARTH_RADIUS_KM = 6371.0
+INT_SCALE = 100  # OR-Tools needs integer arc costs: 0.01 km resolution
+
+CACHE_SIZE = 128
+_cache = OrderedDict()
+
+
+def _equirectangular(origins, targets):
+    # Same approximation the solvers always used: the longitude term is
+    # scaled by cos() of the *origin* row's latitude, so the matrix is not
+    # exactly symmetric.
+    dx = np.subtract.outer(origins[:, 0], targets[:, 0])
+    dx *= KM_PER_DEGREE
+    dy = np.subtract.outer(origins[:, 1], targets[:, 1])
+    dy *= (KM_PER_DEGREE * np.cos(np.radians(origins[:, 0])))[:, None]
+    return np.hypot(dx, dy, out=dx)
+
+
+def _haversine(origins, targets):
+    lat1, lon1 = np.radians(origins[:, 0]), np.radians(origins[:, 1])
+    lat2, lon2 = np.radians(targets[:, 0]), np.radians(targets[:, 1])
+    a = np.sin(np.subtract.outer(lat1, lat2) / 2)
+    a *= a
+    b = np.sin(np.subtract.outer(lon1, lon2) / 2)
+    b *= b
+    b *= np.outer(np.cos(lat1), np.cos(lat2))
+    a += b
+    np.clip(a, 0.0, 1.0, out=a)
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
+    a *= 2 * EARTH_RADIUS_KM
+    return a
+
+
+METHODS = {
+    "equirectangular": _equirectangular,
+    "haversine": _haversine,
+}
+
+
+def compute_distance_matrix(locations, method="equirectangular", scaled=False):
+    """
+    Pairwise distances between (lat, lon) points, uncached.
+    Returns float32 km, or int64 hundredths of a km when scaled=True.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown distance method: {method}")
+    coords = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+    dist = METHODS[method](coords, coords)
+    if scaled:
+        dist *= INT_SCALE
+        return dist.astype(np.int64)
+    return dist.astype(np.float32)
+
+
+def point_distances(origins, targets, method="equirectangular"):
+    """Rectangular (len(origins), len(targets)) km distances, float64, uncached."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown distance method: {method}")
+    origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+    targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+    return METHODS[method](origins, targets)
+
+
+def leg_distances(origins, targets, method="equirectangular"):
+    """
+    Element-wise km distances origins[i] -> targets[i], float64: the same
+    values as the matching matrix cells, without building the matrix.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown distance method: {method}")
+    o = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+    t = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+    if method == "equirectangular":
+        dx = (o[:, 0] - t[:, 0]) * KM_PER_DEGREE
+        dy = (o[:, 1] - t[:, 1]) * KM_PER_DEGREE * np.cos(np.radians(o[:, 0]))
+        return np.hypot(dx, dy)
+    lat1, lon1, lat2, lon2 = np.radians(o[:, 0]), np.radians(o[:, 1]), np.radians(t[:, 0]), np.radians(t[:, 1])
+    a = np.sin((lat1 - lat2) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon1 - lon2) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix(customers, depot=(0, 0), method="equirectangular", scaled=False):
+    """
+    Distance matrix over [depot] + customers, index 0 being the depot.
+    Results are cached on the coordinate set and returned read-only.
+    """
+    locations = np.vstack([
+        np.asarray(depot, dtype=np.float64).reshape(1, 2),
+        np.asarray(customers, dtype=np.float64).reshape(-1, 2),
+    ])
+    key = (locations.tobytes(), method, scaled)
+    cached = _cache.get(key)
+    if cached is not None:
+        _cache.move_to_end(key)
+        count("distance_cache_hits")
+        return cached
+
+    with span("distance_matrix", size=len(locations)):
+        dist = compute_distance_matrix(locations, method, scaled)
+    dist.setflags(write=False)
+    _cache[key] = dist
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return dist
+
+
+def clear_cache():
+    _cache.clear()
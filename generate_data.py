@@ -2,15 +2,26 @@
 """
 Generate synthetic CVRP instances in Vijayawada, AP with guaranteed feasibility.
 Ensures total demand <= total capacity and no single demand exceeds vehicle capacity.
+
+--columnar streams instances of any size into .npz shards instead (see
+generate_columnar / iter_instances), for load testing at millions of customers.
 """
+import argparse
 import json
+import math
 import os
 import random
+import numpy as np
 
 NUM_INSTANCES = 150
 OUTPUT_DIR = "data/raw"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-random.seed(42)
+SHARD_DIR = f"{OUTPUT_DIR}/shards"
+INDEX_FILE = "index.json"
+
+KM_PER_DEGREE = 111
+DEFAULT_DEPOT = [16.5062, 80.6480]  # Vijayawada Railway Station
+# lat_min, lat_max, lon_min, lon_max around the landmarks below
+VIJAYAWADA_BBOX = (16.4800, 16.5350, 80.6300, 80.6700)
 
 # Realistic Vijayawada landmark locations (lat, lon)
 VIJAYAWADA_LOCATIONS = [
@@ -64,8 +75,169 @@ def generate_instance(idx):
     with open(f"{OUTPUT_DIR}/instance_{idx:03d}.json", "w") as f:
         json.dump(data, f, indent=2)
 
+def _sample_points(rng, n, bbox=None, clusters=None):
+    """
+    n (lat, lon) points, uniform in bbox or from a Gaussian mixture.
+    clusters: list of (lat, lon, std_km, weight)
+    """
+    if clusters:
+        centers = np.array([c[:2] for c in clusters], dtype=np.float64)
+        std_km = np.array([c[2] for c in clusters], dtype=np.float64)
+        weights = np.array([c[3] for c in clusters], dtype=np.float64)
+        which = rng.choice(len(clusters), size=n, p=weights / weights.sum())
+        lat = centers[which, 0] + rng.normal(size=n) * std_km[which] / KM_PER_DEGREE
+        lon_scale = KM_PER_DEGREE * np.cos(np.radians(centers[which, 0]))
+        lon = centers[which, 1] + rng.normal(size=n) * std_km[which] / lon_scale
+        return np.column_stack([lat, lon])
+    lat_min, lat_max, lon_min, lon_max = bbox or VIJAYAWADA_BBOX
+    return np.column_stack([rng.uniform(lat_min, lat_max, n), rng.uniform(lon_min, lon_max, n)])
+
+
+def generate_chunk(rng, n_instances, n_customers, vehicle_capacity=15, num_vehicles=None,
+                   demand_range=(3, 6), bbox=None, clusters=None, depot=DEFAULT_DEPOT, fill=0.9):
+    """
+    Generate n_instances feasible instances as flat columns.
+    n_customers: int, or (min, max) inclusive range drawn per instance
+    num_vehicles: fixed fleet, or None to size each fleet to total demand / fill
+    Returns: dict of arrays with customer rows split by `offsets`
+    """
+    if isinstance(n_customers, int):
+        counts = np.full(n_instances, n_customers, dtype=np.int64)
+    else:
+        counts = rng.integers(n_customers[0], n_customers[1] + 1, size=n_instances)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    total = int(offsets[-1])
+
+    lo, hi = demand_range[0], min(demand_range[1], vehicle_capacity)
+    coords = _sample_points(rng, total, bbox, clusters).astype(np.float32)
+    demands = rng.integers(lo, hi + 1, size=total).astype(np.int32)
+    # bincount, not reduceat: an empty instance must total 0
+    totals = np.bincount(np.repeat(np.arange(n_instances), counts), weights=demands,
+                         minlength=n_instances).astype(np.int64)
+
+    if num_vehicles is None:
+        fleet = np.maximum(1, np.ceil(totals / (vehicle_capacity * fill))).astype(np.int32)
+    else:
+        fleet = np.full(n_instances, num_vehicles, dtype=np.int32)
+        # Same rule as generate_instance: redraw demands until the fleet fits
+        for _ in range(10):
+            over = np.flatnonzero(totals > fleet * vehicle_capacity)
+            if not len(over):
+                break
+            for k in over:
+                demands[offsets[k]:offsets[k + 1]] = rng.integers(lo, hi + 1, size=counts[k])
+                totals[k] = demands[offsets[k]:offsets[k + 1]].sum()
+        else:
+            if (totals > fleet * vehicle_capacity).any():
+                raise ValueError(f"{num_vehicles} trucks x {vehicle_capacity} cannot serve the sampled demand")
+
+    return {
+        "offsets": offsets,
+        "coords": coords,
+        "demands": demands,
+        "depots": np.tile(np.asarray(depot, dtype=np.float32), (n_instances, 1)),
+        "num_vehicles": fleet,
+        "vehicle_capacity": np.full(n_instances, vehicle_capacity, dtype=np.int32),
+    }
+
+
+def generate_columnar(n_instances, n_customers, chunk_size=10000, output_dir=SHARD_DIR, seed=42, **kwargs):
+    """
+    Stream n_instances into uncompressed .npz shards of chunk_size instances
+    and write an index.json listing each shard's instance and customer counts.
+    Extra kwargs go to generate_chunk.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name.startswith("shard_") and name.endswith(".npz"):
+            os.remove(os.path.join(output_dir, name))  # Stale shards from a previous run
+    rng = np.random.default_rng(seed)
+    shards = []
+    first_id = 0
+    for shard_id in range(math.ceil(n_instances / chunk_size)):
+        n = min(chunk_size, n_instances - first_id)
+        chunk = generate_chunk(rng, n, n_customers, **kwargs)
+        chunk["instance_id"] = np.arange(first_id, first_id + n, dtype=np.int64)
+        name = f"shard_{shard_id:05d}.npz"
+        np.savez(os.path.join(output_dir, name), **chunk)
+        shards.append({"file": name, "instances": n, "customers": int(chunk["offsets"][-1])})
+        first_id += n
+    with open(os.path.join(output_dir, INDEX_FILE), "w") as f:
+        json.dump({"shards": shards}, f)
+    return shards
+
+
+def iter_instances(shard_dir=SHARD_DIR):
+    """
+    Yield instances from columnar shards in the same dict layout as the JSON
+    files. customers/demands are NumPy views into the shard, not lists.
+    """
+    with open(os.path.join(shard_dir, INDEX_FILE)) as f:
+        index = json.load(f)
+    for shard in index["shards"]:
+        with np.load(os.path.join(shard_dir, shard["file"])) as z:
+            cols = {k: z[k] for k in z.files}
+        offsets = cols["offsets"]
+        for k in range(len(offsets) - 1):
+            lo, hi = offsets[k], offsets[k + 1]
+            yield {
+                "instance_id": int(cols["instance_id"][k]),
+                "depot": cols["depots"][k],
+                "customers": cols["coords"][lo:hi],
+                "demands": cols["demands"][lo:hi],
+                "num_vehicles": int(cols["num_vehicles"][k]),
+                "vehicle_capacity": int(cols["vehicle_capacity"][k]),
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic CVRP instances")
+    parser.add_argument("--columnar", action="store_true", help="Write .npz shards instead of JSON files")
+    parser.add_argument("--instances", type=int, default=NUM_INSTANCES)
+    parser.add_argument("--customers", type=int, nargs="+", default=None,
+                        help="Customers per instance: N, or MIN MAX (default: 5 8)")
+    parser.add_argument("--vehicles", type=int, default=None, help="Fleet size (default: sized to demand)")
+    parser.add_argument("--capacity", type=int, default=None, help="Vehicle capacity (default: 15)")
+    parser.add_argument("--bbox", type=float, nargs=4, default=None,
+                        metavar=("LAT_MIN", "LAT_MAX", "LON_MIN", "LON_MAX"))
+    parser.add_argument("--clusters", type=str, default=None,
+                        help='JSON list of [lat, lon, std_km, weight], e.g. "[[16.51, 80.64, 1.5, 1]]"')
+    parser.add_argument("--chunk-size", type=int, default=None, help="Instances per shard (default: 10000)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    # The JSON instances keep their fixed Vijayawada landmarks and fleet
+    columnar_only = ["customers", "vehicles", "capacity", "bbox", "clusters", "chunk_size"]
+    if not args.columnar:
+        given = [f"--{name.replace('_', '-')}" for name in columnar_only if getattr(args, name) is not None]
+        if given:
+            parser.error(f"--columnar is required for {', '.join(given)}")
+
+    if args.columnar:
+        args.customers = args.customers or [5, 8]
+        customers = args.customers[0] if len(args.customers) == 1 else tuple(args.customers[:2])
+        print(f"🌍 Streaming {args.instances} instances to {SHARD_DIR}/...")
+        shards = generate_columnar(
+            args.instances, customers,
+            chunk_size=args.chunk_size or 10000,
+            seed=args.seed,
+            vehicle_capacity=args.capacity or 15,
+            num_vehicles=args.vehicles,
+            bbox=args.bbox,
+            clusters=json.loads(args.clusters) if args.clusters else None,
+        )
+        print(f"✅ {sum(s['customers'] for s in shards)} customers in {len(shards)} shards")
+    else:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        for name in os.listdir(OUTPUT_DIR):
+            if name.startswith("instance_") and name.endswith(".json"):
+                os.remove(os.path.join(OUTPUT_DIR, name))  # Stale instances from a larger previous run
+        random.seed(args.seed)
+        print(f"🌍 Generating {args.instances} feasible CVRP instances in Vijayawada...")
+        for i in range(args.instances):
+            generate_instance(i)
+        print(f"✅ Saved to {OUTPUT_DIR}/")
+
+
 if __name__ == "__main__":
-    print("🌍 Generating 150 feasible CVRP instances in Vijayawada...")
-    for i in range(NUM_INSTANCES):
-        generate_instance(i)
-    print(f"✅ Saved to {OUTPUT_DIR}/")
\ No newline at end of file
+    main()
@@ -0,0 +1,142 @@
+# geocoding.py
+"""
+Offline-first place-name lookup for depot resolution.
+Queries are answered from the bundled gazetteer, then from a persistent
+on-disk LRU cache, and only then from a pluggable remote geocoder, whose
+answers are cached. Known cities resolve with a dictionary lookup and no
+network access.
+"""
+
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.json")
+CACHE_FILE = "data/cache/geocode.json"
+CACHE_SIZE = 1024
+RECENCY_SAVE_SECONDS = 60  # at most one write per interval for hits that only reorder the LRU
+REMOTE_TIMEOUT = 5  # seconds
+
+
+def normalize(query):
+    """Case-, accent- and whitespace-insensitive lookup key."""
+    text = unicodedata.normalize("NFKD", query)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.casefold().split())
+
+
+def load_gazetteer(path=GAZETTEER_FILE):
+    """Returns: dict normalized name/alias -> (lat, lon)"""
+    with open(path, encoding="utf-8") as f:
+        cities = json.load(f)["cities"]
+    places = {}
+    for city in cities:
+        for name in [city["name"]] + city.get("aliases", []):
+            places[normalize(name)] = (city["lat"], city["lon"])
+    return places
+
+
+class GeocodeCache:
+    """
+    JSON-backed LRU map of normalized query -> (lat, lon). Every insert is
+    written through atomically, so the cache survives restarts and crashes.
+    The file is kept in recency order: hits that change the order are
+    written at most once per RECENCY_SAVE_SECONDS (any insert writes them
+    too), so eviction after a restart follows use, not insertion.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._reordered_at = float("-inf")  # last save triggered by a hit
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for key, value in json.load(f):
+                        self._entries[key] = tuple(value)
+            except (OSError, ValueError):
+                self._entries.clear()  # Unreadable cache: start empty
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None and next(reversed(self._entries)) != key:
+                self._entries.move_to_end(key)
+                if time.monotonic() - self._reordered_at >= RECENCY_SAVE_SECONDS:
+                    self._reordered_at = time.monotonic()
+                    try:
+                        self._save()
+                    except OSError:
+                        pass  # Recency is best effort; the lookup still succeeds
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = tuple(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump([[k, list(v)] for k, v in self._entries.items()], f)
+        os.replace(tmp, self.path)
+
+
+def nominatim_remote(user_agent="q_routenet", timeout=REMOTE_TIMEOUT):
+    """
+    Remote fallback backed by OpenStreetMap Nominatim (needs geopy and
+    network access). Returns: callable query -> (lat, lon) or None
+    """
+    def lookup(query):
+        try:
+            from geopy.exc import GeopyError
+            from geopy.geocoders import Nominatim
+        except ImportError:
+            return None
+        try:
+            location = Nominatim(user_agent=user_agent, timeout=timeout).geocode(query)
+        except GeopyError:
+            return None
+        return None if location is None else (location.latitude, location.longitude)
+    return lookup
+
+
+class Geocoder:
+    """
+    Args:
+        gazetteer: dict normalized name -> (lat, lon) (default: bundled file)
+        cache: GeocodeCache (default: CACHE_FILE)
+        remote: callable query -> (lat, lon) or None, consulted only when the
+            gazetteer and cache miss (default: none, i.e. fully offline)
+    """
+
+    def __init__(self, gazetteer=None, cache=None, remote=None):
+        self.gazetteer = load_gazetteer() if gazetteer is None else gazetteer
+        self.cache = GeocodeCache() if cache is None else cache
+        self.remote = remote
+
+    def geocode(self, query):
+        """Returns: (lat, lon), or None if the place is unknown."""
+        key = normalize(query)
+        location = self.gazetteer.get(key) or self.cache.get(key)
+        if location is not None or self.remote is None:
+            return location
+        location = self.remote(query)
+        if location is not None:
+            location = (float(location[0]), float(location[1]))
+            self.cache.put(key, location)
+        return location
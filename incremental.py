@@ -0,0 +1,248 @@
+# incremental.py
+"""
+Incremental re-optimization of a routed solution.
+RoutingState keeps the per-truck tours and loads between events. A new
+order goes into the cheapest feasible position among its nearest trucks, a
+cancellation is spliced out of its tour, and a cost change (a city-wide
+factor such as rain, or congestion zones) re-solves only the tours that
+have a stop in a zone that changed. Each event does work proportional to
+the tours it touches, not to the whole fleet (a zone over the depot only
+re-measures the other tours' depot legs).
+
+Costs are km scaled per leg: a leg with an endpoint inside a congestion
+zone costs km times the largest such zone factor, and everything is scaled
+by the city-wide factor. "distance" stays in plain km.
+"""
+
+import numpy as np
+from distance import distance_matrix, leg_distances
+from exact_tsp import held_karp, MAX_STOPS
+from local_search import improve_tour, tour_length
+from construct_routes import DEPOT, EXACT_TSP_MAX_STOPS, MATRIX_MAX_STOPS
+from telemetry import traced
+
+CANDIDATE_TRUCKS = 4  # nearest trucks (by centroid) priced for each insertion
+RESOLVE_BUDGET = 0.01  # seconds of 2-opt / Or-opt per re-solved tour
+
+
+def _zone_factors(points, zones):
+    """Largest factor of the zones containing each (lat, lon) point (1.0 outside all)."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    factors = np.ones(len(points))
+    for lat, lon, radius_km, factor in zones:
+        inside = leg_distances(np.tile([lat, lon], (len(points), 1)), points) <= radius_km
+        factors[inside] = np.maximum(factors[inside], factor)
+    return factors
+
+
+class RoutingState:
+    """
+    Mutable routed solution.
+    Args:
+        customers: list of [lat, lon]; a customer's id is its index
+        demands: list of int
+        tours: per-vehicle lists of customer ids in visit order (e.g. the
+            stop_ids of build_routes); customers on no tour are unserved
+        vehicle_capacity, num_vehicles, depot: as for build_routes
+    """
+
+    def __init__(self, customers, demands, tours, vehicle_capacity=15, num_vehicles=3, depot=DEPOT):
+        self.depot = np.asarray(depot, dtype=np.float64)
+        self.vehicle_capacity = vehicle_capacity
+        self.num_vehicles = num_vehicles
+        self.points = {i: np.asarray(c, dtype=np.float64) for i, c in enumerate(customers)}
+        self.demands = {i: int(d) for i, d in enumerate(demands)}
+        self.factor = 1.0
+        self.zones = ()
+        self.version = 0  # bumped by every event that changes a tour or cost
+        self._next_id = len(customers)
+
+        padded = [list(t) for t in tours] + [[] for _ in range(num_vehicles - len(tours))]
+        self.tours = padded[:num_vehicles]
+        self.truck_of = {c: vid for vid, tour in enumerate(self.tours) for c in tour}
+        self.loads = [sum(self.demands[c] for c in tour) for tour in self.tours]
+        self._coords = [self._stop_coords(tour) for tour in self.tours]
+        self._sums = np.array([c.sum(axis=0) if len(c) else np.zeros(2) for c in self._coords])
+        self._km = [0.0] * num_vehicles
+        self._base = [0.0] * num_vehicles  # zone-weighted km, before the city-wide factor
+        for vid in range(num_vehicles):
+            self._measure(vid)
+
+    @classmethod
+    def from_routes(cls, customers, demands, routes, vehicle_capacity=15, num_vehicles=3, depot=DEPOT):
+        """State from build_routes / build_routes_hybrid route dicts."""
+        tours = [[] for _ in range(num_vehicles)]
+        for route in routes:
+            tours[route["vehicle_id"]] = list(route["stop_ids"])
+        return cls(customers, demands, tours, vehicle_capacity, num_vehicles, depot)
+
+    def _stop_coords(self, tour):
+        return np.array([self.points[c] for c in tour], dtype=np.float64).reshape(-1, 2)
+
+    def _path(self, vid):
+        """(k + 2, 2): depot, the truck's stops in order, depot."""
+        return np.vstack([self.depot, self._coords[vid], self.depot])
+
+    def _leg_costs(self, origins, targets):
+        """Returns: (km, zone-weighted km) of each leg origins[i] -> targets[i]"""
+        km = leg_distances(origins, targets)
+        if not self.zones:
+            return km, km
+        return km, km * np.maximum(_zone_factors(origins, self.zones), _zone_factors(targets, self.zones))
+
+    def _measure(self, vid):
+        path = self._path(vid)
+        km, base = self._leg_costs(path[:-1], path[1:]) if len(path) > 2 else (np.zeros(1), np.zeros(1))
+        self._km[vid], self._base[vid] = float(km.sum()), float(base.sum())
+
+    @property
+    def total_distance(self):
+        return float(sum(self._km))
+
+    @property
+    def total_cost(self):
+        return float(self.factor * sum(self._base))
+
+    @traced("incremental_insert")
+    def insert(self, location, demand):
+        """
+        Add a customer at its cheapest feasible position, pricing only the
+        CANDIDATE_TRUCKS trucks with room whose stops are centred nearest.
+        Returns: dict customer_id, vehicle_id, position, added_cost
+        Raises: ValueError if no truck has room for demand
+        """
+        point = np.asarray(location, dtype=np.float64)
+        demand = int(demand)
+        room = np.flatnonzero(np.asarray(self.loads) + demand <= self.vehicle_capacity)
+        if len(room) == 0:
+            raise ValueError(f"No truck has room for a demand of {demand}")
+
+        counts = np.array([len(self.tours[v]) for v in room])
+        centroids = np.where(counts[:, None] > 0, self._sums[room] / np.maximum(counts, 1)[:, None], self.depot)
+        nearest = np.argsort(leg_distances(centroids, np.tile(point, (len(room), 1))), kind="stable")
+        best = (np.inf, None, None)
+        for vid in room[nearest[:CANDIDATE_TRUCKS]].tolist():
+            path = self._path(vid)
+            x = np.tile(point, (len(path) - 1, 1))
+            _, to_x = self._leg_costs(path[:-1], x)
+            _, from_x = self._leg_costs(x, path[1:])
+            _, direct = self._leg_costs(path[:-1], path[1:])
+            delta = to_x + from_x - direct
+            pos = int(np.argmin(delta))
+            if delta[pos] < best[0]:
+                best = (float(delta[pos]), vid, pos)
+        added, vid, pos = best
+
+        cid = self._next_id
+        self._next_id += 1
+        self.points[cid], self.demands[cid] = point, demand
+        self.tours[vid].insert(pos, cid)
+        self.truck_of[cid] = vid
+        self.loads[vid] += demand
+        self._coords[vid] = np.insert(self._coords[vid], pos, point, axis=0)
+        self._sums[vid] += point
+        self._measure(vid)
+        self.version += 1
+        return {"customer_id": cid, "vehicle_id": vid, "position": pos, "added_cost": self.factor * added}
+
+    @traced("incremental_remove")
+    def remove(self, customer_id):
+        """
+        Splice a customer out of its tour; the rest of the tour keeps its order.
+        Returns: dict vehicle_id, saved_cost
+        Raises: KeyError if the customer is not on any tour
+        """
+        vid = self.truck_of.pop(customer_id)
+        pos = self.tours[vid].index(customer_id)
+        before = self.factor * self._base[vid]
+        del self.tours[vid][pos]
+        self.loads[vid] -= self.demands[customer_id]
+        self._sums[vid] -= self._coords[vid][pos]
+        self._coords[vid] = np.delete(self._coords[vid], pos, axis=0)
+        self._measure(vid)
+        self.version += 1
+        return {"vehicle_id": vid, "saved_cost": before - self.factor * self._base[vid]}
+
+    def _affected_by(self, zones):
+        """
+        Split the non-empty trucks with the depot or a stop inside any of
+        zones into (to re-solve, to re-measure): one whose stops are all
+        outside only changes on its first and last (depot) legs.
+        """
+        trucks = [vid for vid in range(self.num_vehicles) if len(self._coords[vid])]
+        if not zones or not trucks:
+            return [], []
+        coords = np.vstack([self._coords[vid] for vid in trucks])
+        owner = np.repeat(np.arange(len(trucks)), [len(self._coords[vid]) for vid in trucks])
+        inside = np.bincount(owner, weights=_zone_factors(coords, zones) != 1.0, minlength=len(trucks)) > 0
+        depot_inside = _zone_factors([self.depot], zones)[0] != 1.0
+        resolve, measure = [], []
+        for k, vid in enumerate(trucks):
+            if inside[k]:
+                resolve.append(vid)
+            elif depot_inside:
+                measure.append(vid)
+        return resolve, measure
+
+    def _resolve(self, vid):
+        """Re-solve one truck's tour under the current zone costs, warm-started from its current order."""
+        tour = self.tours[vid]
+        if len(tour) < 3 or len(tour) > MATRIX_MAX_STOPS:
+            self._measure(vid)
+            return
+        dist = np.asarray(distance_matrix(self._coords[vid], self.depot), dtype=np.float64)
+        if self.zones:
+            nodes = np.vstack([self.depot, self._coords[vid]])
+            f = _zone_factors(nodes, self.zones)
+            dist = dist * np.maximum(f[:, None], f[None, :])
+        if len(tour) <= min(EXACT_TSP_MAX_STOPS, MAX_STOPS):
+            route, _ = held_karp(dist)
+        else:
+            route, _, _ = improve_tour(list(range(len(tour) + 1)), dist, RESOLVE_BUDGET)
+        order = [i - 1 for i in route[1:]]
+        if tour_length([0] + [i + 1 for i in order], dist) < tour_length(list(range(len(tour) + 1)), dist) - 1e-9:
+            self.tours[vid] = [tour[i] for i in order]
+            self._coords[vid] = self._coords[vid][order]
+        self._measure(vid)
+
+    @traced("incremental_set_costs")
+    def set_costs(self, factor=1.0, zones=()):
+        """
+        Change the cost model. factor scales every leg, so it never changes
+        the best tours and only rescales costs; zones ((lat, lon, radius_km,
+        factor) tuples) that were added or dropped re-solve the trucks with a
+        stop in them. If such a zone holds the depot, the other trucks only
+        change on their first and last legs, so they are re-measured on their
+        current tours rather than re-solved.
+        Returns: list of re-solved vehicle ids
+        """
+        zones = tuple(tuple(float(v) for v in z) for z in zones)
+        changed = set(zones) ^ set(self.zones)
+        self.factor = float(factor)
+        self.zones = zones
+        affected, touched = self._affected_by(tuple(changed))
+        for vid in affected:
+            self._resolve(vid)
+        for vid in touched:
+            self._measure(vid)
+        self.version += 1
+        return affected
+
+    def routes(self):
+        """build_routes-style route dicts (non-empty trucks), plus each route's cost."""
+        out = []
+        for vid, tour in enumerate(self.tours):
+            if not tour:
+                continue
+            stops = [self.points[c].tolist() for c in tour]
+            out.append({
+                "vehicle_id": vid,
+                "customers": [self.points[c].tolist() for c in sorted(tour)],
+                "route": stops,
+                "stop_ids": list(tour),
+                "load": self.loads[vid],
+                "capacity": self.vehicle_capacity,
+                "distance": round(self._km[vid], 2),
+                "cost": round(self.factor * self._base[vid], 2),
+            })
+        return out
@@ -1,10 +1,252 @@
 # team_a_core/inference.py
-import joblib
+import os
+import threading
+from collections import OrderedDict
 import numpy as np
+from qml_engine import NumpyVQC, load_export
+from telemetry import count, traced
 
+EXPORT_FILE = "data/models/vqc_model.npz"  # pickle-free model + scaler, preferred unless stale
+MODEL_FILE = "data/models/vqc_model.joblib"
+SCALER_FILE = "data/processed/scaler.joblib"
+CACHE_SIZE = 65536  # distinct customer feature rows kept by the prediction cache
+FEATURE_QUANTUM = 1e-6  # cache key resolution in scaled feature units (~1 cm of lat/lon)
+
+# Process-wide model registry: (path, loader) -> (mtime, loaded object)
+_registry = {}
+_lock = threading.Lock()
+
+
+def _joblib_load(path):
+    # joblib is imported on first load, not with the module, so importing
+    # inference stays cheap for callers that never touch the models
+    import joblib
+
+    return joblib.load(path)
+
+
+def _load_entry(path, loader=_joblib_load):
+    """Returns: (mtime, loaded object)"""
+    key = (path, loader)
+    mtime = os.path.getmtime(path)
+    entry = _registry.get(key)
+    if entry is None or entry[0] != mtime:
+        with _lock:
+            entry = _registry.get(key)
+            if entry is None or entry[0] != mtime:
+                entry = (mtime, loader(path))
+                _registry[key] = entry
+    return entry
+
+
+def _load_engine(path):
+    model = _joblib_load(path)
+    # qml_model.py --mode minibatch saves a NumpyVQC directly
+    return model if isinstance(model, NumpyVQC) else NumpyVQC.from_qiskit(model)
+
+
+def _export_is_current():
+    """True if EXPORT_FILE exists and no joblib model or scaler was written after it."""
+    if not os.path.exists(EXPORT_FILE):
+        return False
+    export_mtime = os.path.getmtime(EXPORT_FILE)
+    return all(not os.path.exists(path) or os.path.getmtime(path) <= export_mtime
+               for path in (MODEL_FILE, SCALER_FILE))
+
+
+def _current_models():
+    """
+    Returns: (model, scaler, version). Served from EXPORT_FILE (NumPy only)
+    when qml_model.py has written one, else from the joblib pickles, which
+    import sklearn and, for Qiskit-trained models, Qiskit. A model retrained
+    or a scaler refitted without re-exporting makes the export stale, and
+    the pickles are used until `qml_model.py --export-only` catches it up.
+    """
+    if _export_is_current():
+        mtime, (model, scaler) = _load_entry(EXPORT_FILE, load_export)
+        return model, scaler, (EXPORT_FILE, mtime)
+    model_mtime, model = _load_entry(MODEL_FILE, _load_engine)
+    scaler_mtime, scaler = _load_entry(SCALER_FILE)
+    return model, scaler, (MODEL_FILE, model_mtime, SCALER_FILE, scaler_mtime)
+
+
+def get_models():
+    """
+    Return (model, scaler), reloading either one if its file changed on disk.
+    The model is the NumPy statevector engine built from the trained VQC.
+    """
+    model, scaler, _ = _current_models()
+    return model, scaler
+
+
+def warm_up():
+    """Load the models ahead of the first request."""
+    get_models()
+
+
+def clear_models():
+    with _lock:
+        _registry.clear()
+    prediction_cache.clear()
+
+
+class PredictionCache:
+    """
+    LRU map of quantized, scaled (lat, lon, demand) feature rows to class
+    probabilities, so customers seen before skip the circuit simulation.
+    Entries belong to one model version (the model and scaler file mtimes);
+    the first lookup under a new version empties the cache.
+
+    Rows are simulated at their quantized position, so a hit returns exactly
+    what a miss would have computed. A row counts as a miss only when it has
+    to be simulated; repeats of one feature row within a batch are simulated
+    once and count as hits.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE, quantum=FEATURE_QUANTUM):
+        self.max_entries = max_entries
+        self.quantum = quantum
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def probabilities(self, model, scaled, version):
+        """
+        Class probabilities for scaler-transformed feature rows.
+        Args:
+            model: NumpyVQC
+            scaled: (n, 3) scaler.transform output (before the 2*pi encoding)
+            version: hashable model version; a change invalidates every entry
+        Returns: (n, num_classes) array
+        """
+        quantized = np.ascontiguousarray(np.rint(np.asarray(scaled) / self.quantum), dtype=np.int64)
+        n = len(quantized)
+        keys = quantized.view(np.dtype((np.void, quantized.itemsize * quantized.shape[1]))).ravel()
+        proba = np.empty((n, len(model.classes)))
+        missing = {}  # key -> rows of this batch with that key
+
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+            entries = self._entries
+            for i, key in enumerate(keys.tolist()):
+                cached = entries.get(key)
+                if cached is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    entries.move_to_end(key)
+                    proba[i] = cached
+
+        fresh = ()
+        if missing:
+            first = [rows[0] for rows in missing.values()]
+            fresh = model.predict_proba(quantized[first] * self.quantum * 2 * np.pi)
+            for rows, p in zip(missing.values(), fresh):
+                proba[rows] = p
+
+        evicted = 0
+        with self._lock:
+            self.hits += n - len(missing)
+            self.misses += len(missing)
+            if version == self._version and self.max_entries > 0:
+                for key, p in zip(missing, fresh):
+                    self._entries[key] = p
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    evicted += 1
+                self.evictions += evicted
+        count("prediction_cache_hits", n - len(missing))
+        count("prediction_cache_misses", len(missing))
+        if evicted:
+            count("prediction_cache_evictions", evicted)
+        return proba
+
+
+prediction_cache = PredictionCache()
+
+
+def cache_stats():
+    """Hit / miss / eviction counts of the process-wide prediction cache."""
+    return prediction_cache.stats()
+
+
+def _scale(scaler, X):
+    # A MinMaxScaler transform is X * scale_ + min_; applying it directly
+    # skips sklearn's per-call input validation, which dominates small requests
+    if hasattr(scaler, "min_") and not getattr(scaler, "clip", False):
+        return X * scaler.scale_ + scaler.min_
+    return scaler.transform(X)
+
+
+def _predict_proba(X):
+    """Returns: (model, class probabilities) for raw feature rows, via the prediction cache."""
+    model, scaler, version = _current_models()
+    if len(X) == 0:
+        return model, np.empty((0, len(model.classes)))
+    return model, prediction_cache.probabilities(model, _scale(scaler, X), version)
+
+
+def _features(customers, demands):
+    return np.array([[c[0], c[1], d] for c, d in zip(customers, demands)], dtype=np.float64).reshape(-1, 3)
+
+
+@traced()
 def predict_assignments(customers, demands):
-    vqc = joblib.load("data/models/vqc_model.joblib")
-    scaler = joblib.load("data/processed/scaler.joblib")
-    X = np.array([[c[0], c[1], d] for c, d in zip(customers, demands)])
-    X = scaler.transform(X) * 2 * np.pi
-    return vqc.predict(X).tolist()
\ No newline at end of file
+    model, proba = _predict_proba(_features(customers, demands))
+    return model.classes[np.argmax(proba, axis=1)].tolist()
+
+
+@traced()
+def predict_with_confidence(customers, demands):
+    """
+    Returns: (assignments, confidence) where confidence is each customer's
+    predicted probability of its assigned truck.
+    """
+    model, proba = _predict_proba(_features(customers, demands))
+    best = np.argmax(proba, axis=1)
+    return model.classes[best].tolist(), proba[np.arange(len(best)), best].tolist()
+
+
+@traced()
+def predict_assignments_batch(instances):
+    """
+    Predict truck assignments for many instances with one transform + cache lookup.
+    Args:
+        instances: list of (customers, demands) pairs
+    Returns:
+        list of assignment lists, one per instance
+    """
+    if not instances:
+        return []
+    blocks = [_features(customers, demands) for customers, demands in instances]
+    sizes = [len(b) for b in blocks]
+    if not sum(sizes):
+        return [[] for _ in blocks]
+    offsets = np.cumsum(sizes)[:-1]
+    model, proba = _predict_proba(np.vstack(blocks))
+    y = model.classes[np.argmax(proba, axis=1)]
+    return [part.tolist() for part in np.split(y, offsets)]
@@ -0,0 +1,129 @@
+# local_search.py
+"""
+2-opt and Or-opt improvement for single-truck tours.
+Moves are scored for every tour position against a short candidate list of
+nearest neighbours in one vectorised NumPy pass, and the best one is applied
+until no move improves the tour or the wall-clock budget runs out.
+"""
+
+import time
+import numpy as np
+
+NUM_NEIGHBORS = 8
+MAX_SEGMENT = 3  # Or-opt moves chains of 1..MAX_SEGMENT stops
+EPS = 1e-9
+
+
+def tour_length(tour, dist_matrix):
+    """Length of the closed tour (returns to tour[0])."""
+    tour = np.asarray(tour)
+    return float(dist_matrix[tour, np.roll(tour, -1)].sum())
+
+
+def neighbor_lists(dist_matrix, k=NUM_NEIGHBORS):
+    """(n, k) indices of each node's k nearest other nodes."""
+    n = len(dist_matrix)
+    k = min(k, n - 1)
+    d = np.array(dist_matrix, dtype=np.float64)
+    np.fill_diagonal(d, np.inf)
+    nbrs = np.argpartition(d, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(d, nbrs, axis=1).argsort(axis=1)
+    return np.take_along_axis(nbrs, order, axis=1)
+
+
+def _best_two_opt(t, pos, d, nbrs):
+    n = len(t)
+    a = t[:, None]
+    b = t[(np.arange(n) + 1) % n][:, None]
+    c = nbrs[t]
+    j = pos[c]
+    dd = t[(j + 1) % n]
+    delta = d[a, c] + d[b, dd] - d[a, b] - d[c, dd]
+    invalid = (c == b) | (dd == a)
+    delta[invalid] = np.inf
+    i, k = np.unravel_index(np.argmin(delta), delta.shape)
+    return delta[i, k], i, j[i, k]
+
+
+def _apply_two_opt(t, i, j):
+    if i < j:
+        t[i + 1:j + 1] = t[i + 1:j + 1][::-1].copy()
+    else:
+        # Reverse the complementary arc; same tour for symmetric costs
+        t[j + 1:i + 1] = t[j + 1:i + 1][::-1].copy()
+    return t
+
+
+def _best_or_opt(t, pos, d, nbrs):
+    n = len(t)
+    best = (np.inf, None)
+    idx = np.arange(n)
+    for seg_len in range(1, min(MAX_SEGMENT, n - 2) + 1):
+        s0 = t[idx]
+        s1 = t[(idx + seg_len - 1) % n]
+        p = t[(idx - 1) % n]
+        nx = t[(idx + seg_len) % n]
+        removal = d[p, s0] + d[s1, nx] - d[p, nx]
+
+        c = nbrs[s0]  # insert next to one of s0's neighbours
+        cn = t[(pos[c] + 1) % n]
+        # c must lie outside the segment and not be its current predecessor
+        offset = (pos[c] - idx[:, None]) % n
+        invalid = (offset < seg_len) | (c == p[:, None])
+        fwd = d[c, s0[:, None]] + d[s1[:, None], cn] - d[c, cn] - removal[:, None]
+        rev = d[c, s1[:, None]] + d[s0[:, None], cn] - d[c, cn] - removal[:, None]
+        for delta, reverse in ((fwd, False), (rev, True)):
+            delta = np.where(invalid, np.inf, delta)
+            i, k = np.unravel_index(np.argmin(delta), delta.shape)
+            if delta[i, k] < best[0]:
+                best = (delta[i, k], (i, seg_len, c[i, k], reverse))
+    return best
+
+
+def _apply_or_opt(t, i, seg_len, c, reverse):
+    r = np.roll(t, -i)
+    seg, rest = r[:seg_len], r[seg_len:]
+    k = int(np.flatnonzero(rest == c)[0])
+    seg = seg[::-1] if reverse else seg
+    return np.concatenate([rest[:k + 1], seg, rest[k + 1:]])
+
+
+def improve_tour(tour, dist_matrix, time_budget=0.05, num_neighbors=NUM_NEIGHBORS):
+    """
+    Improve a closed tour with 2-opt and Or-opt moves.
+    Moves are chosen on the symmetrised costs; the result is kept only if
+    it is shorter under the real (possibly asymmetric) matrix.
+    Returns: (tour starting at tour[0], distance saved, seconds spent)
+    """
+    start = time.perf_counter()
+    tour = np.asarray(tour, dtype=np.int64)
+    n = len(tour)
+    before = tour_length(tour, dist_matrix)
+    if n < 4:
+        return tour.tolist(), 0.0, time.perf_counter() - start
+
+    d = np.asarray(dist_matrix, dtype=np.float64)
+    d = (d + d.T) / 2
+    nbrs = neighbor_lists(d, num_neighbors)
+    t = tour.copy()
+    deadline = start + time_budget
+
+    while time.perf_counter() < deadline:
+        pos = np.empty(n, dtype=np.int64)
+        pos[t] = np.arange(n)
+        delta, i, j = _best_two_opt(t, pos, d, nbrs)
+        if delta < -EPS:
+            t = _apply_two_opt(t, i, j)
+            continue
+        delta, move = _best_or_opt(t, pos, d, nbrs)
+        if delta < -EPS:
+            t = _apply_or_opt(t, *move)
+            continue
+        break
+
+    # Rotate back so the tour starts where it did (the depot)
+    t = np.roll(t, -int(np.flatnonzero(t == tour[0])[0]))
+    after = tour_length(t, dist_matrix)
+    if after >= before:
+        return tour.tolist(), 0.0, time.perf_counter() - start
+    return t.tolist(), before - after, time.perf_counter() - start
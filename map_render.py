@@ -0,0 +1,126 @@
+# map_render.py
+"""
+Folium map building for large route solutions.
+Customers go into one GeoJSON layer (or a FastMarkerCluster once there are
+thousands), each truck's route is one LineString simplified to what is
+visible at the initial zoom (Leaflet's smoothFactor simplifies further
+when zoomed out), and the finished map is serialized to HTML once so it can
+be cached per solution instead of re-rendered on every rerun.
+"""
+
+import math
+import numpy as np
+import folium
+from folium.plugins import FastMarkerCluster
+
+CLUSTER_THRESHOLD = 2000  # customers; above this, markers are clustered
+SIMPLIFY_PIXELS = 1.0  # route detail finer than this at the initial zoom is dropped
+SMOOTH_FACTOR = 1.5  # Leaflet's per-zoom path simplification, in pixels
+EARTH_CIRCUMFERENCE_M = 40075016.686
+TILE_SIZE = 256
+
+
+def degrees_per_pixel(lat, zoom):
+    """Approximate size of one screen pixel, in degrees of latitude, at zoom."""
+    meters = EARTH_CIRCUMFERENCE_M * math.cos(math.radians(lat)) / (TILE_SIZE * 2 ** zoom)
+    return meters / 111_320
+
+
+def simplify_polyline(points, tolerance):
+    """
+    Douglas-Peucker simplification of a (lat, lon) polyline.
+    Drops vertices that lie within tolerance (degrees) of the simplified
+    line; the endpoints are always kept.
+    Returns: (m, 2) array, m <= len(points)
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(pts)
+    if n <= 2 or tolerance <= 0:
+        return pts
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        seg = pts[end] - pts[start]
+        rel = pts[start + 1:end] - pts[start]
+        length = np.hypot(*seg)
+        if length == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return pts[keep]
+
+
+def customer_layer(customers, color):
+    """
+    One layer for all customers.
+    Args:
+        customers: list of (lat, lon, label)
+        color: marker colour
+    """
+    if len(customers) > CLUSTER_THRESHOLD:
+        return FastMarkerCluster([[lat, lon] for lat, lon, _ in customers], name="Customers")
+    features = [{
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        "properties": {"label": label},
+    } for lat, lon, label in customers]
+    return folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        name="Customers",
+        marker=folium.CircleMarker(radius=6, color=color, fill=True),
+        tooltip=folium.GeoJsonTooltip(fields=["label"], labels=False),
+    )
+
+
+def route_layer(routes, tolerance, weight=3, opacity=0.6):
+    """
+    One layer for all truck routes.
+    Args:
+        routes: list of {"color", "line": [(lat, lon), ...]}
+        tolerance: Douglas-Peucker tolerance in degrees
+    """
+    features = []
+    for route in routes:
+        line = simplify_polyline(route["line"], tolerance)
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": line[:, ::-1].tolist()},
+            "properties": {"color": route["color"]},
+        })
+    return folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        name="Routes",
+        smooth_factor=SMOOTH_FACTOR,
+        style_function=lambda f: {"color": f["properties"]["color"], "weight": weight, "opacity": opacity},
+    )
+
+
+def build_map(depot, customers, routes, customer_color, weight=3, opacity=0.6, zoom_start=13):
+    """
+    Args:
+        depot: (lat, lon)
+        customers: list of (lat, lon, label)
+        routes: list of {"color", "line": [(lat, lon), ...]}
+    Returns: folium.Map
+    """
+    m = folium.Map(location=list(depot), zoom_start=zoom_start)
+    folium.Marker(list(depot), popup="Depot", icon=folium.Icon(color='red')).add_to(m)
+    customer_layer(customers, customer_color).add_to(m)
+    tolerance = SIMPLIFY_PIXELS * degrees_per_pixel(depot[0], zoom_start)
+    route_layer(routes, tolerance, weight, opacity).add_to(m)
+    return m
+
+
+def render_map_html(depot, customers, routes, customer_color, weight=3, opacity=0.6, zoom_start=13):
+    """build_map serialized to a standalone HTML page."""
+    return build_map(depot, customers, routes, customer_color, weight, opacity, zoom_start).get_root().render()
@@ -0,0 +1,225 @@
+# pipeline.py
+"""
+Incremental generate → solve → preprocess → train runner.
+
+Each stage is fingerprinted from its parameters, the source of the modules
+it runs, and the content digest of its upstream stage's outputs. Outputs are
+kept in a content-addressed cache under data/cache/<stage>/<fingerprint>/, so
+a stage whose fingerprint is already cached is restored instead of re-run.
+Changing only the training hyperparameters, for example, re-runs train alone.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))  # stage scripts and sources live here
+CACHE_DIR = "data/cache"
+COMPLETE_FILE = "_complete.json"
+
+
+class Stage:
+    def __init__(self, name, script, sources, outputs, params, args):
+        self.name = name
+        self.script = script  # relative to ROOT
+        self.sources = sources  # modules whose code affects the outputs, relative to ROOT
+        self.outputs = outputs  # working-tree paths the script writes
+        self.params = params  # defaults; fingerprinted
+        self.args = args  # params -> CLI arguments for the script
+
+
+def _flag(name, value):
+    if value is None or value is False:
+        return []
+    if value is True:
+        return [f"--{name}"]
+    return [f"--{name}", str(value)]
+
+
+STAGES = [
+    Stage(
+        "generate", "generate_data.py", ["generate_data.py"], ["data/raw"],
+        {"instances": 150},
+        lambda p: _flag("instances", p["instances"]),
+    ),
+    Stage(
+        "solve", "solve_labels.py",
+        ["solve_labels.py", "distance.py", "dataset_store.py"],
+        ["data/processed/labeled_store"],
+        {"workers": None, "budget": None},
+        lambda p: _flag("workers", p["workers"]) + _flag("budget", p["budget"]),
+    ),
+    Stage(
+        "preprocess", "preprocess.py", ["preprocess.py", "dataset_store.py"],
+        ["data/processed/preprocessed_X.npy", "data/processed/preprocessed_y.npy",
+         "data/processed/scaler.joblib"],
+        {},
+        lambda p: [],
+    ),
+    Stage(
+        "train", "qml_model.py", ["qml_model.py", "qml_engine.py", "dataset_store.py"],
+        ["data/models/vqc_model.joblib", "data/models/vqc_model.npz"],
+        {"mode": "qiskit", "epochs": 50, "batch-size": 256, "lr": 0.05, "patience": 5},
+        lambda p: sum((_flag(k, v) for k, v in p.items()), []),
+    ),
+]
+
+# Parameters that change how fast a stage runs but not what it produces
+UNHASHED_PARAMS = {"solve": {"workers"}}
+# Parameters a stage only reads in one mode: stage -> {mode: params}
+MODE_PARAMS = {"train": {"minibatch": {"epochs", "batch-size", "lr", "patience"}}}
+
+
+def _hash_files(paths, root=""):
+    """Digest of every file under paths (names relative to root + bytes), in sorted order."""
+    h = hashlib.sha256()
+    files = []
+    for path in paths:
+        full = os.path.join(root, path)
+        if os.path.isdir(full):
+            for parent, _, names in os.walk(full):
+                files.extend(os.path.join(parent, n) for n in names)
+        elif os.path.exists(full):
+            files.append(full)
+    for path in sorted(files):
+        name = os.path.relpath(path, root) if root else path
+        h.update(name.replace(os.sep, "/").encode())
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def fingerprint(stage, params, upstream_digest):
+    ignored = set(UNHASHED_PARAMS.get(stage.name, ()))
+    for mode, mode_params in MODE_PARAMS.get(stage.name, {}).items():
+        if params.get("mode") != mode:
+            ignored |= mode_params
+    hashed = {k: v for k, v in params.items() if k not in ignored}
+    payload = json.dumps({
+        "stage": stage.name,
+        "params": hashed,
+        "code": _hash_files(stage.sources, ROOT),
+        "upstream": upstream_digest,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _copy(src, dst):
+    if os.path.isdir(dst):
+        shutil.rmtree(dst)
+    elif os.path.exists(dst):
+        os.remove(dst)
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    if os.path.isdir(src):
+        shutil.copytree(src, dst)
+    else:
+        shutil.copy2(src, dst)
+
+
+def _latest_mtime(path):
+    """Newest modification time of path or any file under it (None if missing)."""
+    if os.path.isdir(path):
+        times = [os.path.getmtime(path)]
+        for root, _, names in os.walk(path):
+            times.extend(os.path.getmtime(os.path.join(root, n)) for n in names)
+        return max(times)
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def run_stage(stage, params, upstream_digest, force=False):
+    """
+    Restore the stage's outputs from cache if its fingerprint is known,
+    otherwise run it and cache the outputs.
+    Returns: (output digest, whether the stage actually ran)
+    Raises: RuntimeError if the script leaves a declared output missing or
+        untouched (nothing is cached then)
+    """
+    fp = fingerprint(stage, params, upstream_digest)
+    entry = os.path.join(CACHE_DIR, stage.name, fp)
+    marker = os.path.join(entry, COMPLETE_FILE)
+
+    if not force and os.path.exists(marker):
+        with open(marker) as f:
+            record = json.load(f)
+        if _hash_files(stage.outputs) != record["digest"]:
+            for out in stage.outputs:
+                _copy(os.path.join(entry, out), out)
+        print(f"⏭️  {stage.name}: unchanged ({fp}), reusing cached outputs")
+        return record["digest"], False
+
+    cmd = [sys.executable, os.path.join(ROOT, stage.script)] + stage.args(params)
+    if stage.name == "solve":
+        # Resume only from a checkpoint written for these exact inputs
+        cmd += ["--checkpoint", os.path.join(CACHE_DIR, stage.name, f"{fp}.ckpt.jsonl")]
+    print(f"▶️  {stage.name} ({fp}): {' '.join(cmd[1:])}")
+    os.makedirs(entry, exist_ok=True)
+    before = {out: _latest_mtime(out) for out in stage.outputs}
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    elapsed = time.perf_counter() - start
+
+    for out in stage.outputs:
+        after = _latest_mtime(out)
+        if after is None or after == before[out]:
+            raise RuntimeError(f"{stage.name} did not write {out}; not caching its outputs")
+
+    for out in stage.outputs:
+        _copy(out, os.path.join(entry, out))
+    digest = _hash_files(stage.outputs)
+    with open(marker, "w") as f:
+        json.dump({"fingerprint": fp, "params": params, "upstream": upstream_digest,
+                   "digest": digest, "seconds": round(elapsed, 3)}, f, indent=2)
+    return digest, True
+
+
+def run_pipeline(overrides=None, force=(), until=None):
+    """
+    Run stages in order. overrides: {stage: {param: value}}; force: stage
+    names to re-run regardless of cache; until: last stage to run.
+    """
+    overrides = overrides or {}
+    digest = None
+    ran = []
+    for stage in STAGES:
+        params = dict(stage.params, **overrides.get(stage.name, {}))
+        digest, did_run = run_stage(stage, params, digest, force=stage.name in force)
+        if did_run:
+            ran.append(stage.name)
+        if stage.name == until:
+            break
+    return ran
+
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental CVRP/VQC pipeline")
+    parser.add_argument("--set", action="append", default=[], metavar="STAGE.PARAM=VALUE",
+                        help="Override a stage parameter, e.g. train.epochs=20")
+    parser.add_argument("--force", action="append", default=[], choices=[s.name for s in STAGES],
+                        help="Re-run a stage even if cached")
+    parser.add_argument("--until", choices=[s.name for s in STAGES], help="Stop after this stage")
+    args = parser.parse_args()
+
+    overrides = {}
+    names = {s.name for s in STAGES}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        stage_name, _, param = key.partition(".")
+        if stage_name not in names or not param:
+            parser.error(f"bad --set {item!r}: expected STAGE.PARAM=VALUE with STAGE in {sorted(names)}")
+        overrides.setdefault(stage_name, {})[param] = _parse_value(value)
+
+    ran = run_pipeline(overrides, set(args.force), args.until)
+    print(f"✅ Pipeline complete; ran: {', '.join(ran) or 'nothing'}")
@@ -1,25 +1,64 @@
 # team_a_core/preprocess.py
-import joblib
+import argparse
+import os
+import sys
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
+from dataset_store import LabelStore, STORE_DIR, NUM_FEATURES, PREPROCESSED_X, PREPROCESSED_Y
 
 INPUT_FILE = "data/processed/labeled_dataset.joblib"
-OUTPUT_FILE = "data/processed/preprocessed_data.joblib"
 SCALER_FILE = "data/processed/scaler.joblib"
+CHUNK_ROWS = 1 << 16
 
-dataset = joblib.load(INPUT_FILE)
-X, y = [], []
-for instance in dataset:
-    X.extend(instance["features"])
-    y.extend(instance["labels"])
 
-X = np.array(X, dtype=np.float32)
-y = np.array(y, dtype=np.int32)
+def iter_chunks(chunk_rows=CHUNK_ROWS):
+    """(features, labels) chunks from the label store, or the legacy joblib list."""
+    if LabelStore.exists(STORE_DIR):
+        yield from LabelStore(STORE_DIR).iter_chunks(chunk_rows)
+        return
+    import joblib
 
-scaler = MinMaxScaler()
-X_scaled = scaler.fit_transform(X)
-X_scaled = X_scaled * 2 * np.pi
+    for instance in joblib.load(INPUT_FILE):
+        yield np.array(instance["features"], dtype=np.float32), np.array(instance["labels"], dtype=np.int32)
 
-joblib.dump(scaler, SCALER_FILE)
-joblib.dump({"X": X_scaled, "y": y}, OUTPUT_FILE)
-print(f"✅ Preprocessed data saved to {OUTPUT_FILE}")
\ No newline at end of file
+
+def main(argv=None):
+    import joblib
+    from sklearn.preprocessing import MinMaxScaler
+
+    argparse.ArgumentParser(description="Scale labelled features for VQC training").parse_args(argv)
+
+    if not LabelStore.exists(STORE_DIR) and not os.path.exists(INPUT_FILE):
+        print(f"❌ No labelled data: neither {STORE_DIR}/ nor {INPUT_FILE} exists; run solve_labels.py first")
+        sys.exit(1)
+
+    # Pass 1: fit the scaler incrementally
+    scaler = MinMaxScaler()
+    n_rows = 0
+    for X, _ in iter_chunks():
+        if len(X):
+            scaler.partial_fit(X)
+            n_rows += len(X)
+    if n_rows == 0:
+        print("❌ No labelled customers to preprocess (every instance was unsolvable?); "
+              "check the solve_labels.py output")
+        sys.exit(1)
+
+    # Pass 2: scale chunk by chunk straight into memory-mapped outputs
+    X_out = np.lib.format.open_memmap(PREPROCESSED_X, mode="w+", dtype=np.float32, shape=(n_rows, NUM_FEATURES))
+    y_out = np.lib.format.open_memmap(PREPROCESSED_Y, mode="w+", dtype=np.int32, shape=(n_rows,))
+    pos = 0
+    for X, y in iter_chunks():
+        X_scaled = scaler.transform(np.asarray(X, dtype=np.float32)) * 2 * np.pi
+        X_out[pos:pos + len(X)] = X_scaled
+        y_out[pos:pos + len(y)] = y
+        pos += len(X)
+    X_out.flush()
+    y_out.flush()
+    del X_out, y_out
+
+    joblib.dump(scaler, SCALER_FILE)
+    print(f"✅ Preprocessed data saved to {PREPROCESSED_X} / {PREPROCESSED_Y}")
+
+
+if __name__ == "__main__":
+    main()
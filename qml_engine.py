@@ -0,0 +1,352 @@
+# qml_engine.py
+"""
+Batched NumPy statevector engine for the VQC used in qml_model.py.
+Covers ZZFeatureMap + RealAmplitudes with linear entanglement and exact
+(shot-free) probabilities, evaluating N samples at once without building
+Qiskit circuits.
+
+export_model / load_export store a trained model and its feature scaling as
+a small .npz of plain arrays (no pickles), which loads with NumPy alone.
+"""
+
+import os
+import numpy as np
+from telemetry import count
+
+EXPORT_VERSION = 1  # bump when the .npz layout changes
+FEATURE_MAP = "ZZFeatureMap"
+ANSATZ = "RealAmplitudes"
+ENTANGLEMENT = "linear"
+
+
+def _apply_1q(state, gate, qubit):
+    # state: (..., 2, ..., 2) with qubit q on axis -(q + 1) (Qiskit little-endian)
+    axis = state.ndim - 1 - qubit
+    state = np.moveaxis(state, axis, -1)
+    state = state @ gate.T
+    return np.moveaxis(state, -1, axis)
+
+
+def _apply_cx(state, control, target):
+    c_axis = state.ndim - 1 - control
+    t_axis = state.ndim - 1 - target
+    state = state.copy()
+    idx = [slice(None)] * state.ndim
+    idx[c_axis] = 1
+    sub = state[tuple(idx)]
+    # After fixing the control axis, the target axis shifts down if it came later
+    sub_t = t_axis - 1 if t_axis > c_axis else t_axis
+    state[tuple(idx)] = np.flip(sub, axis=sub_t)
+    return state
+
+
+def _ry(theta):
+    c, s = np.cos(theta / 2), np.sin(theta / 2)
+    return np.array([[c, -s], [s, c]])
+
+
+def _basis_bits(num_qubits):
+    # bits[b, q] = value of qubit q in basis state b
+    b = np.arange(2 ** num_qubits)
+    return (b[:, None] >> np.arange(num_qubits)[None, :]) & 1
+
+
+def _hadamard_matrix(num_qubits):
+    h = np.array([[1.0, 1.0], [1.0, -1.0]]) / np.sqrt(2)
+    out = np.array([[1.0]])
+    for _ in range(num_qubits):
+        out = np.kron(out, h)
+    return out
+
+
+def ansatz_unitary(weights, num_qubits=3, reps=1):
+    """
+    Dense 2^n x 2^n real unitary of RealAmplitudes(num_qubits, reps, "linear").
+    weights are ordered like the ansatz's Qiskit parameters (layer-major).
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    dim = 2 ** num_qubits
+    # Columns of the identity, shaped as a batch of basis states
+    state = np.eye(dim).reshape((dim,) + (2,) * num_qubits)
+    for layer in range(reps + 1):
+        for q in range(num_qubits):
+            state = _apply_1q(state, _ry(weights[layer * num_qubits + q]), q)
+        if layer < reps:
+            for q in range(num_qubits - 1):
+                state = _apply_cx(state, q, q + 1)
+    # Row k of `state` is U|k>, so U = state.T
+    return state.reshape(dim, dim).T
+
+
+def feature_phases(X, num_qubits=3):
+    """
+    Per-sample diagonal phase angles of one ZZFeatureMap repetition ("linear"),
+    i.e. the angle applied to each basis state: shape (N, 2^n).
+    """
+    X = np.asarray(X, dtype=np.float64).reshape(-1, num_qubits)
+    bits = _basis_bits(num_qubits)
+    angles = 2.0 * X @ bits.T
+    for q in range(num_qubits - 1):
+        pair = (np.pi - X[:, q]) * (np.pi - X[:, q + 1])
+        angles += 2.0 * pair[:, None] * (bits[:, q] ^ bits[:, q + 1])[None, :]
+    return angles
+
+
+def feature_states(X, num_qubits=3, reps=1):
+    """Statevectors produced by ZZFeatureMap(num_qubits, reps, "linear") from |0>: (N, 2^n)."""
+    phases = np.exp(1j * feature_phases(X, num_qubits))
+    hn = _hadamard_matrix(num_qubits)
+    state = np.full((phases.shape[0], 2 ** num_qubits), 2 ** (-num_qubits / 2), dtype=np.complex128)
+    state = state * phases
+    for _ in range(reps - 1):
+        state = (state @ hn) * phases
+    return state
+
+
+def class_map(basis_classes, num_classes):
+    """One-hot (2^n, K) matrix sending each measured basis state to its class index."""
+    basis_classes = np.asarray(basis_classes)
+    return (basis_classes[:, None] == np.arange(num_classes)[None, :]).astype(np.float64)
+
+
+class NumpyVQC:
+    """
+    Drop-in predictor for a trained Qiskit VQC built from ZZFeatureMap and
+    RealAmplitudes with linear entanglement.
+    """
+
+    def __init__(self, weights, classes, num_qubits=3, feature_reps=1, ansatz_reps=1, basis_classes=None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.num_qubits = num_qubits
+        self.feature_reps = feature_reps
+        self.ansatz_reps = ansatz_reps
+        if basis_classes is None:
+            # VQC's default parity interpretation
+            basis_classes = np.arange(2 ** num_qubits) % len(self.classes)
+        self.basis_classes = np.asarray(basis_classes, dtype=np.int64)
+        self._unitary = ansatz_unitary(self.weights, num_qubits, ansatz_reps)
+        self._class_map = class_map(self.basis_classes, len(self.classes))
+
+    @classmethod
+    def from_qiskit(cls, vqc):
+        """Build from a fitted qiskit_machine_learning VQC."""
+        classes = vqc._target_encoder.categories_[0]
+        # Read the interpretation off the model rather than assuming b % K:
+        # VQC binds its parity's modulus when constructed, not when fitted.
+        basis_classes = [vqc.interpret(b) for b in range(2 ** vqc.num_qubits)]
+        return cls(
+            vqc.weights,
+            classes,
+            num_qubits=vqc.num_qubits,
+            feature_reps=vqc.feature_map.reps,
+            ansatz_reps=vqc.ansatz.reps,
+            basis_classes=basis_classes,
+        )
+
+    def basis_probabilities(self, X):
+        count("circuit_evaluations", len(X))
+        psi = feature_states(X, self.num_qubits, self.feature_reps)
+        amps = np.einsum("nb,kb->nk", psi, self._unitary, optimize=True)
+        return amps.real ** 2 + amps.imag ** 2
+
+    def predict_proba(self, X):
+        return self.basis_probabilities(X) @ self._class_map
+
+    def predict(self, X):
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def _shifted_unitaries(weights, num_qubits, reps):
+    # Parameter-shift rule for RY: dU/dθ_i ↔ (U(θ_i + π/2) - U(θ_i - π/2)) / 2
+    shifts = []
+    for i in range(len(weights)):
+        for sign in (1.0, -1.0):
+            w = weights.copy()
+            w[i] += sign * np.pi / 2
+            shifts.append(ansatz_unitary(w, num_qubits, reps))
+    return np.stack(shifts)
+
+
+def cross_entropy(model, X, y_index):
+    probs = np.clip(model.predict_proba(X), 1e-10, 1.0)
+    return float(-np.mean(np.log(probs[np.arange(len(y_index)), y_index])))
+
+
+def loss_and_grad(model, X, y_index):
+    """
+    Mean cross-entropy of model on (X, class indices) and its exact gradient
+    w.r.t. the ansatz weights, vectorised over the batch via parameter shift.
+    """
+    psi = feature_states(X, model.num_qubits, model.feature_reps)
+    probs = np.clip(np.abs(psi @ model._unitary.T) ** 2 @ model._class_map, 1e-10, 1.0)
+    rows = np.arange(len(y_index))
+    loss = float(-np.mean(np.log(probs[rows, y_index])))
+
+    shifted = _shifted_unitaries(model.weights, model.num_qubits, model.ansatz_reps)
+    count("circuit_evaluations", len(X) * (1 + len(shifted)))
+    amps = np.einsum("nb,skb->snk", psi, shifted, optimize=True)
+    shifted_probs = (amps.real ** 2 + amps.imag ** 2) @ model._class_map  # (2P, N, K)
+    dprobs = (shifted_probs[0::2] - shifted_probs[1::2]) / 2  # (P, N, K)
+    grad = -np.mean(dprobs[:, rows, y_index] / probs[rows, y_index], axis=1)
+    return loss, grad
+
+
+def train_minibatch(X, y, num_qubits=3, feature_reps=1, ansatz_reps=1, batch_size=256,
+                    epochs=50, learning_rate=0.05, val_fraction=0.1, patience=5,
+                    checkpoint_dir=None, checkpoint_every=5, seed=42):
+    """
+    Fit a NumpyVQC on the full dataset with shuffled mini-batches and Adam.
+    Stops early when held-out loss has not improved for `patience` epochs and
+    returns the model with the best validation weights.
+    """
+    rng = np.random.default_rng(seed)
+    # X may be a memory-mapped array: only index batches out of it
+    classes, y_index = np.unique(np.asarray(y), return_inverse=True)
+
+    order = rng.permutation(len(X))
+    n_val = int(len(X) * val_fraction) if len(X) > 1 else 0
+    val_idx, train_idx = order[:n_val], order[n_val:]
+
+    weights = rng.uniform(0, 2 * np.pi, size=num_qubits * (ansatz_reps + 1))
+    model = NumpyVQC(weights, classes, num_qubits, feature_reps, ansatz_reps)
+    m = np.zeros_like(weights)
+    v = np.zeros_like(weights)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    step = 0
+
+    best_loss, best_weights, stale = np.inf, weights.copy(), 0
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    for epoch in range(1, epochs + 1):
+        rng.shuffle(train_idx)
+        for start in range(0, len(train_idx), batch_size):
+            batch = train_idx[start:start + batch_size]
+            _, grad = loss_and_grad(model, X[batch], y_index[batch])
+            step += 1
+            m = beta1 * m + (1 - beta1) * grad
+            v = beta2 * v + (1 - beta2) * grad ** 2
+            m_hat = m / (1 - beta1 ** step)
+            v_hat = v / (1 - beta2 ** step)
+            model = NumpyVQC(model.weights - learning_rate * m_hat / (np.sqrt(v_hat) + eps),
+                             classes, num_qubits, feature_reps, ansatz_reps)
+
+        eval_idx = val_idx if n_val else train_idx
+        val_loss = cross_entropy(model, X[eval_idx], y_index[eval_idx])
+        val_acc = np.mean(model.predict(X[eval_idx]) == classes[y_index[eval_idx]])
+        print(f"  epoch {epoch:3d}  val_loss={val_loss:.4f}  val_acc={val_acc:.3f}")
+
+        if val_loss < best_loss - 1e-6:
+            best_loss, best_weights, stale = val_loss, model.weights.copy(), 0
+        else:
+            stale += 1
+
+        if checkpoint_dir and epoch % checkpoint_every == 0:
+            np.savez(os.path.join(checkpoint_dir, f"vqc_epoch_{epoch:03d}.npz"),
+                     weights=model.weights, classes=classes, epoch=epoch, val_loss=val_loss)
+
+        if stale >= patience:
+            print(f"  early stop at epoch {epoch} (best val_loss={best_loss:.4f})")
+            break
+
+    return NumpyVQC(best_weights, classes, num_qubits, feature_reps, ansatz_reps)
+
+
+class MinMaxScaling:
+    """
+    The fitted part of an sklearn MinMaxScaler: transform(X) = X * scale_ + min_.
+    Stands in for the pickled scaler when serving from an export.
+    """
+
+    def __init__(self, min_, scale_):
+        self.min_ = np.asarray(min_, dtype=np.float64)
+        self.scale_ = np.asarray(scale_, dtype=np.float64)
+
+    @classmethod
+    def from_sklearn(cls, scaler):
+        if getattr(scaler, "clip", False):
+            raise ValueError("Clipping MinMaxScaler is not supported by the export format")
+        return cls(scaler.min_, scaler.scale_)
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64) * self.scale_ + self.min_
+
+
+def export_model(path, model, scaler):
+    """
+    Write model (NumpyVQC) and scaler (MinMaxScaler or MinMaxScaling) to a
+    pickle-free .npz. The file is replaced atomically, so readers polling its
+    mtime never see a partial write.
+    """
+    if not isinstance(scaler, MinMaxScaling):
+        scaler = MinMaxScaling.from_sklearn(scaler)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp.npz"
+    np.savez(
+        tmp,
+        version=EXPORT_VERSION,
+        feature_map=FEATURE_MAP,
+        ansatz=ANSATZ,
+        entanglement=ENTANGLEMENT,
+        num_qubits=model.num_qubits,
+        feature_reps=model.feature_reps,
+        ansatz_reps=model.ansatz_reps,
+        weights=model.weights,
+        classes=model.classes,
+        basis_classes=model.basis_classes,
+        scaler_min=scaler.min_,
+        scaler_scale=scaler.scale_,
+    )
+    os.replace(tmp, path)
+
+
+def load_export(path):
+    """
+    Read an export_model file.
+    Returns: (NumpyVQC, MinMaxScaling)
+    """
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data["version"])
+        if version != EXPORT_VERSION:
+            raise ValueError(f"{path}: export version {version}, expected {EXPORT_VERSION}")
+        circuit = (str(data["feature_map"]), str(data["ansatz"]), str(data["entanglement"]))
+        if circuit != (FEATURE_MAP, ANSATZ, ENTANGLEMENT):
+            raise ValueError(f"{path}: unsupported circuit {circuit}")
+        model = NumpyVQC(
+            data["weights"],
+            data["classes"],
+            num_qubits=int(data["num_qubits"]),
+            feature_reps=int(data["feature_reps"]),
+            ansatz_reps=int(data["ansatz_reps"]),
+            basis_classes=data["basis_classes"],
+        )
+        scaler = MinMaxScaling(data["scaler_min"], data["scaler_scale"])
+    return model, scaler
+
+
+def check_parity(vqc, X, atol=1e-6):
+    """
+    Compare NumpyVQC against the Qiskit VQC's own forward pass on X.
+    Returns the max absolute probability difference; raises if above atol.
+    """
+    engine = NumpyVQC.from_qiskit(vqc)
+    X = np.asarray(X, dtype=np.float64)
+    expected = vqc.neural_network.forward(X, vqc.weights)
+    got = engine.predict_proba(X)
+    diff = float(np.max(np.abs(expected - got)))
+    if diff > atol:
+        raise AssertionError(f"NumpyVQC differs from Qiskit VQC by {diff:.2e}")
+    if not np.array_equal(engine.predict(X), np.asarray(vqc.predict(X)).ravel()):
+        raise AssertionError("NumpyVQC predictions differ from Qiskit VQC")
+    return diff
+
+
+if __name__ == "__main__":
+    import joblib
+    from dataset_store import load_preprocessed
+
+    vqc = joblib.load("data/models/vqc_model.joblib")
+    X = np.asarray(load_preprocessed()[0][:500])
+    diff = check_parity(vqc, X)
+    print(f"✅ NumpyVQC matches Qiskit VQC on {len(X)} samples (max |Δp| = {diff:.2e})")
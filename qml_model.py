@@ -2,76 +2,150 @@
 """
 Fast Variational Quantum Classifier (VQC) for CVRP.
 Trains in <30 seconds with good accuracy.
+
+--mode minibatch trains the same circuit on the full dataset with the NumPy
+statevector engine (qml_engine.py) and analytic gradients instead of
+Qiskit + COBYLA on the first 200 samples.
+
+Besides the joblib pickle, every run writes EXPORT_FILE: the weights,
+circuit spec and scaler arrays that inference.py serves from without
+importing Qiskit or sklearn. --export-only rewrites it from the existing
+pickles.
 """
 
-from qiskit.circuit.library import ZZFeatureMap
-from qiskit_machine_learning.algorithms import VQC
-from qiskit_algorithms.optimizers import COBYLA
-import joblib
+import argparse
 import numpy as np
 import os
+import sys
+from qml_engine import NumpyVQC, export_model, train_minibatch as fit_minibatch
+from dataset_store import load_preprocessed
 
 # -------------------------------
 # Configuration
 # -------------------------------
 MODEL_DIR = "data/models"
-os.makedirs(MODEL_DIR, exist_ok=True)
+MODEL_FILE = f"{MODEL_DIR}/vqc_model.joblib"
+EXPORT_FILE = f"{MODEL_DIR}/vqc_model.npz"
+SCALER_FILE = "data/processed/scaler.joblib"  # written by preprocess.py
+CHECKPOINT_DIR = f"{MODEL_DIR}/checkpoints"
 
-# Load preprocessed data
-data = joblib.load("data/processed/preprocessed_data.joblib")
-X_train, y_train = data["X"], data["y"]
 
-# Limit training size for speed (use first 200 samples)
-n_train = min(200, len(X_train))
-X_train = X_train[:n_train]
-y_train = y_train[:n_train]
+def train_qiskit(X_train, y_train):
+    from qiskit.circuit.library import ZZFeatureMap, RealAmplitudes
+    from qiskit_machine_learning.algorithms import VQC
+    from qiskit_algorithms.optimizers import COBYLA
 
-print(f"🧠 Training VQC on {n_train} samples...")
+    # Limit training size for speed (use first 200 samples)
+    n_train = min(200, len(X_train))
+    X_train = np.asarray(X_train[:n_train])
+    y_train = np.asarray(y_train[:n_train])
 
-# -------------------------------
-# Quantum Feature Map (Shallow)
-# -------------------------------
-feature_map = ZZFeatureMap(
-    feature_dimension=3,
-    reps=1,  # Only 1 repetition → shallow circuit
-    entanglement="linear"
-)
-
-# -------------------------------
-# Ansatz (Simple, Few Parameters)
-# -------------------------------
-from qiskit.circuit.library import RealAmplitudes
+    print(f"🧠 Training VQC on {n_train} samples...")
 
-ansatz = RealAmplitudes(
-    num_qubits=3,
-    reps=1,  # Only 1 layer → faster simulation
-    entanglement="linear"
-)
+    # -------------------------------
+    # Quantum Feature Map (Shallow)
+    # -------------------------------
+    feature_map = ZZFeatureMap(
+        feature_dimension=3,
+        reps=1,  # Only 1 repetition → shallow circuit
+        entanglement="linear"
+    )
 
-# -------------------------------
-# Optimizer (Fast, Low Iterations)
-# -------------------------------
-optimizer = COBYLA(maxiter=40)  # Reduced from 100 to 40
+    # -------------------------------
+    # Ansatz (Simple, Few Parameters)
+    # -------------------------------
+    ansatz = RealAmplitudes(
+        num_qubits=3,
+        reps=1,  # Only 1 layer → faster simulation
+        entanglement="linear"
+    )
 
-# -------------------------------
-# Variational Quantum Classifier
-# -------------------------------
-vqc = VQC(
-    feature_map=feature_map,
-    ansatz=ansatz,
-    optimizer=optimizer,
-    loss='cross_entropy',
-    # Remove num_classes (deprecated)
-)
+    # -------------------------------
+    # Optimizer (Fast, Low Iterations)
+    # -------------------------------
+    optimizer = COBYLA(maxiter=40)  # Reduced from 100 to 40
 
-# -------------------------------
-# Train & Save
-# -------------------------------
-try:
+    # -------------------------------
+    # Variational Quantum Classifier
+    # -------------------------------
+    vqc = VQC(
+        feature_map=feature_map,
+        ansatz=ansatz,
+        optimizer=optimizer,
+        loss='cross_entropy',
+        # Remove num_classes (deprecated)
+    )
     vqc.fit(X_train, y_train)
-    model_path = f"{MODEL_DIR}/vqc_model.joblib"
-    joblib.dump(vqc, model_path)
-    print(f"✅ VQC model trained and saved to {model_path}")
-except Exception as e:
-    print(f"❌ Training failed: {e}")
-    # Fallback: Save a dummy model structure if needed
\ No newline at end of file
+    return vqc
+
+
+def train_minibatch(X_train, y_train, epochs=50, batch_size=256, learning_rate=0.05, patience=5):
+    print(f"🧠 Training VQC (NumPy engine) on {len(X_train)} samples...")
+    return fit_minibatch(
+        X_train, y_train,
+        feature_reps=1,
+        ansatz_reps=1,
+        batch_size=batch_size,
+        epochs=epochs,
+        learning_rate=learning_rate,
+        patience=patience,
+        checkpoint_dir=CHECKPOINT_DIR,
+    )
+
+
+def export(vqc, path=EXPORT_FILE, scaler_file=SCALER_FILE):
+    """Write the pickle-free serving export of vqc (Qiskit VQC or NumpyVQC)."""
+    import joblib
+
+    engine = vqc if isinstance(vqc, NumpyVQC) else NumpyVQC.from_qiskit(vqc)
+    export_model(path, engine, joblib.load(scaler_file))
+    print(f"✅ Serving export saved to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the CVRP VQC")
+    parser.add_argument("--mode", choices=["qiskit", "minibatch"], default="qiskit")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--lr", type=float, default=0.05)
+    parser.add_argument("--patience", type=int, default=5)
+    parser.add_argument("--export-only", action="store_true",
+                        help=f"Only rewrite {EXPORT_FILE} from {MODEL_FILE} and {SCALER_FILE}")
+    args = parser.parse_args(argv)
+
+    if args.export_only:
+        import joblib
+
+        export(joblib.load(MODEL_FILE))
+        return
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    if args.mode == "qiskit":
+        # Import Qiskit ahead of joblib (which load_preprocessed may pull in):
+        # the fitted VQC holds a local parity closure that joblib.dump can
+        # only pickle with dill, loaded by qiskit_machine_learning, imported first.
+        import qiskit_machine_learning  # noqa: F401
+
+    # Load preprocessed data
+    X_train, y_train = load_preprocessed()
+
+    # -------------------------------
+    # Train & Save
+    # -------------------------------
+    try:
+        if args.mode == "minibatch":
+            vqc = train_minibatch(X_train, y_train, args.epochs, args.batch_size, args.lr, args.patience)
+        else:
+            vqc = train_qiskit(X_train, y_train)
+        import joblib
+
+        joblib.dump(vqc, MODEL_FILE)
+        print(f"✅ VQC model trained and saved to {MODEL_FILE}")
+        export(vqc)
+    except Exception as e:
+        print(f"❌ Training failed: {e}")
+        sys.exit(1)  # Non-zero so the pipeline does not cache stale model files
+
+
+if __name__ == "__main__":
+    main()
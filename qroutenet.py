@@ -0,0 +1,98 @@
+# qroutenet.py
+"""
+Single command-line entry point for Q-RouteNet.
+
+    python qroutenet.py generate|label|preprocess|train|bench|serve [script options]
+    python qroutenet.py predict [instance.json]
+    python qroutenet.py route [instance.json] [--local-search | --hybrid]
+
+Subcommands are dispatched by name and each one imports its module only
+when it runs, so `predict` and `route` never pay for the Qiskit,
+matplotlib or Streamlit imports they do not use. The pipeline subcommands
+forward their remaining arguments to the script's own main().
+"""
+
+import argparse
+import importlib
+import json
+import sys
+
+# subcommand -> (module, help) for the pipeline scripts
+SCRIPTS = {
+    "generate": ("generate_data", "Generate synthetic CVRP instances"),
+    "label": ("solve_labels", "Label instances with OR-Tools"),
+    "preprocess": ("preprocess", "Scale features"),
+    "train": ("qml_model", "Train the VQC"),
+    "bench": ("bench_suite", "Benchmark VQC, OR-Tools and baselines"),
+    "serve": ("serve", "Run the HTTP/JSON routing service"),
+}
+
+
+def read_instance(path):
+    """Instance JSON in the data/raw layout, from path or stdin ('-')."""
+    if path == "-":
+        return json.load(sys.stdin)
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _instance_args(instance):
+    return (instance["customers"], instance["demands"], int(instance.get("num_vehicles", 3)),
+            int(instance.get("vehicle_capacity", 15)), instance.get("depot"))
+
+
+def cmd_predict(args):
+    from inference import predict_assignments
+
+    customers, demands, _, _, _ = _instance_args(read_instance(args.instance))
+    print(json.dumps({"assignments": predict_assignments(customers, demands)}))
+
+
+def cmd_route(args):
+    from inference import predict_assignments
+    from construct_routes import build_routes, build_routes_hybrid, DEPOT
+
+    customers, demands, num_vehicles, capacity, depot = _instance_args(read_instance(args.instance))
+    depot = DEPOT if depot is None else depot
+    assignments = predict_assignments(customers, demands)
+    if args.hybrid:
+        routes, total = build_routes_hybrid(customers, demands, assignments, capacity, num_vehicles,
+                                            depot=depot)
+    else:
+        routes, total = build_routes(customers, demands, assignments, capacity, num_vehicles,
+                                     local_search=args.local_search, depot=depot)
+    print(json.dumps({"assignments": assignments, "total_distance": total, "routes": routes}))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="qroutenet", description="Q-RouteNet command-line interface")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in SCRIPTS.items():
+        sub.add_parser(name, help=help_text, add_help=False)
+
+    predict = sub.add_parser("predict", help="Predict truck assignments for one instance")
+    predict.add_argument("instance", nargs="?", default="-", help="Instance JSON file (default: stdin)")
+    predict.set_defaults(func=cmd_predict)
+
+    route = sub.add_parser("route", help="Predict and build delivery routes for one instance")
+    route.add_argument("instance", nargs="?", default="-", help="Instance JSON file (default: stdin)")
+    mode = route.add_mutually_exclusive_group()
+    mode.add_argument("--local-search", action="store_true", help="Improve each truck's tour with 2-opt / Or-opt")
+    mode.add_argument("--hybrid", action="store_true", help="Refine the routes with OR-Tools guided local search")
+    route.set_defaults(func=cmd_route)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in SCRIPTS:
+        # Everything after the subcommand belongs to the script's own parser
+        module = importlib.import_module(SCRIPTS[argv[0]][0])
+        sys.argv[0] = f"qroutenet {argv[0]}"
+        return module.main(argv[1:])
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    main()
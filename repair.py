@@ -0,0 +1,245 @@
+# repair.py
+"""
+Distance-aware capacity repair for truck assignments.
+Moves customers out of overloaded trucks in order of cheapest estimated
+insertion cost, preferring moves that clear a truck's whole overload.
+"""
+
+import numpy as np
+from distance import point_distances
+from telemetry import count
+
+REPACK_NODES = 20000  # placements tried by the last-resort backtracking repack
+
+
+def _truck_centroids(points, assignments, depot, num_vehicles):
+    sums = np.zeros((num_vehicles, 2))
+    counts = np.zeros(num_vehicles)
+    valid = (assignments >= 0) & (assignments < num_vehicles)
+    np.add.at(sums, assignments[valid], points[valid])
+    np.add.at(counts, assignments[valid], 1)
+    centroids = np.tile(np.asarray(depot, dtype=np.float64), (num_vehicles, 1))
+    used = counts > 0
+    centroids[used] = sums[used] / counts[used][:, None]
+    return centroids, used
+
+
+def _first_fit(demand, assign, vehicle_capacity, num_vehicles):
+    """
+    The original fix-up: in index order, move each customer on an overloaded
+    (or no valid) truck to the first other truck with room.
+    Returns: (assignments, loads)
+    """
+    assign = assign.copy()
+    valid = (assign >= 0) & (assign < num_vehicles)
+    loads = np.bincount(assign[valid], weights=demand[valid], minlength=num_vehicles).astype(np.int64)
+    for i in range(len(assign)):
+        src = assign[i]
+        src_valid = 0 <= src < num_vehicles
+        if src_valid and loads[src] <= vehicle_capacity:
+            continue
+        for target in range(num_vehicles):
+            if target != src and loads[target] + demand[i] <= vehicle_capacity:
+                assign[i] = target
+                loads[target] += demand[i]
+                if src_valid:
+                    loads[src] -= demand[i]
+                break
+    return assign, loads
+
+
+def _pack_search(demand, assign, join, vehicle_capacity, num_vehicles, max_nodes=REPACK_NODES):
+    """
+    Last resort: re-place every customer, largest demand first, trying its
+    own truck and then the others cheapest first, backtracking when one fits
+    nowhere. Exhaustive for small instances; gives up after max_nodes tries.
+    Returns: (assignments, loads), or None if no packing was found
+    """
+    order = np.argsort(-demand, kind="stable")
+    choices = []
+    for i in order:
+        preferred = np.argsort(join[i], kind="stable")
+        src = assign[i]
+        if 0 <= src < num_vehicles:
+            preferred = np.concatenate([[src], preferred[preferred != src]])
+        choices.append(preferred)
+    packed = np.full(len(assign), -1, dtype=np.int64)
+    loads = np.zeros(num_vehicles, dtype=np.int64)
+    next_choice = np.zeros(len(order), dtype=np.int64)
+    tried_empty = np.zeros(len(order), dtype=bool)  # Every empty truck is interchangeable for feasibility
+    nodes = 0
+    depth = 0
+    while 0 <= depth < len(order):
+        i = order[depth]
+        if packed[i] >= 0:  # Backtracked here: undo this customer's placement
+            loads[packed[i]] -= demand[i]
+            packed[i] = -1
+        placed = False
+        while next_choice[depth] < num_vehicles:
+            target = choices[depth][next_choice[depth]]
+            next_choice[depth] += 1
+            if loads[target] + demand[i] > vehicle_capacity:
+                continue
+            if loads[target] == 0:
+                if tried_empty[depth]:
+                    continue
+                tried_empty[depth] = True
+            nodes += 1
+            if nodes > max_nodes:
+                return None
+            packed[i] = target
+            loads[target] += demand[i]
+            placed = True
+            break
+        if placed:
+            depth += 1
+        else:
+            next_choice[depth] = 0
+            tried_empty[depth] = False
+            depth -= 1
+    return (packed, loads) if depth == len(order) else None
+
+
+def repair_assignments(customers, demands, assignments, vehicle_capacity=15, num_vehicles=3, depot=(0, 0)):
+    """
+    Move customers until no truck exceeds vehicle_capacity.
+
+    Customers with no valid truck are placed first, largest demand first, on
+    the cheapest truck with room. Then, in rounds, each overloaded truck
+    (largest excess first) gives away one customer. Every (customer, target)
+    pair that fits the target's slack reduces the excess and is scored by the
+    detour of joining the target minus the detour saved leaving the source,
+    both estimated against truck centroids (an empty truck costs a depot
+    round trip). The cheapest move that clears the whole excess is taken if
+    there is one, else the cheapest move overall. Rounds repeat while any
+    move happens; each move costs O(stops on the source x trucks).
+
+    A truck whose excess is beyond any one of its customers' demand is first
+    drained in bulk: each pass gives every customer its cheapest truck with
+    room and takes those moves cheapest first, until a single move could
+    clear what is left.
+
+    If that leaves an overload although total demand fits the fleet, the
+    original first-fit fix-up is tried, then a backtracking repack (largest
+    demand first, own truck first) bounded by REPACK_NODES placements.
+
+    Returns:
+        assignments: list of truck IDs
+        feasible: False if some truck is still overloaded (or a customer is
+            unassigned): total demand exceeds the fleet, a demand exceeds
+            vehicle_capacity, or every strategy above ran out of moves
+    """
+    n = len(customers)
+    if n == 0:
+        return list(assignments), True
+    points = np.asarray(customers, dtype=np.float64).reshape(-1, 2)
+    demand = np.asarray(demands, dtype=np.int64)
+    original = np.asarray(assignments, dtype=np.int64)
+    assign = original.copy()
+
+    valid = (assign >= 0) & (assign < num_vehicles)
+    loads = np.bincount(assign[valid], weights=demand[valid], minlength=num_vehicles).astype(np.int64)
+    if valid.all() and (loads <= vehicle_capacity).all():
+        return assign.tolist(), True
+
+    centroids, used = _truck_centroids(points, assign, depot, num_vehicles)
+    join = point_distances(points, centroids)  # (n, trucks)
+    join[:, ~used] = 2 * point_distances(points, [depot])  # depot round trip
+    leave = np.zeros(n)
+    leave[valid] = join[np.flatnonzero(valid), assign[valid]]
+
+    moves = 0
+    for i in sorted(np.flatnonzero(~valid), key=lambda i: -demand[i]):
+        fits = vehicle_capacity - loads >= demand[i]
+        if fits.any():
+            target = int(np.argmin(np.where(fits, join[i], np.inf)))
+            assign[i] = target
+            loads[target] += demand[i]
+            moves += 1
+
+    def best_move(src):
+        """Cheapest excess-reducing move off src, preferring ones that clear it: (customer, target) or None."""
+        members = np.flatnonzero((assign == src) & (demand > 0))
+        fits = demand[members][:, None] <= (vehicle_capacity - loads)[None, :]
+        fits[:, src] = False
+        if not fits.any():
+            return None
+        clears = demand[members] >= loads[src] - vehicle_capacity
+        if fits[clears].any():
+            fits[~clears] = False
+        cost = np.where(fits, join[members] - leave[members][:, None], np.inf)
+        k, target = np.unravel_index(int(np.argmin(cost)), cost.shape)
+        return int(members[k]), int(target)
+
+    def drain(src):
+        """Bulk moves off src while its excess exceeds its largest demand. Returns: moves made"""
+        members = np.flatnonzero((assign == src) & (demand > 0))
+        if not len(members) or loads[src] - vehicle_capacity <= demand[members].max():
+            return 0
+        largest = demand[members].max()
+        made = 0
+        while loads[src] - vehicle_capacity > largest:
+            # Each pass prices every member against the trucks with room now,
+            # then takes them cheapest first; a member whose target has since
+            # filled up waits for the next pass.
+            fits = demand[members][:, None] <= (vehicle_capacity - loads)[None, :]
+            fits[:, src] = False
+            cost = np.where(fits, join[members] - leave[members][:, None], np.inf)
+            targets = np.argmin(cost, axis=1)
+            best = cost[np.arange(len(members)), targets]
+            order = np.argsort(best, kind="stable")
+            order = order[np.isfinite(best[order])]
+            if not len(order):
+                break
+            taken = np.zeros(len(members), dtype=bool)
+            for k in order.tolist():
+                i, target = members[k], targets[k]
+                if demand[i] > vehicle_capacity - loads[target]:
+                    continue
+                taken[k] = True
+                assign[i] = target
+                loads[src] -= demand[i]
+                loads[target] += demand[i]
+                made += 1
+                if loads[src] - vehicle_capacity <= largest:
+                    break
+            if not taken.any():
+                break
+            members = members[~taken]
+        return made
+
+    moved = True
+    while moved:
+        moved = False
+        excess = loads - vehicle_capacity
+        over = np.flatnonzero(excess > 0)
+        for src in over[np.argsort(-excess[over], kind="stable")]:
+            made = drain(src)
+            moves += made
+            moved = moved or made > 0
+            if loads[src] <= vehicle_capacity:
+                continue
+            move = best_move(src)
+            if move is None:
+                continue  # Nothing fits anywhere yet; other moves may free room
+            i, target = move
+            assign[i] = target
+            loads[src] -= demand[i]
+            loads[target] += demand[i]
+            moves += 1
+            moved = True
+
+    feasible = bool(((assign >= 0) & (assign < num_vehicles)).all() and (loads <= vehicle_capacity).all())
+    if not feasible and demand.sum() <= num_vehicles * vehicle_capacity and demand.max() <= vehicle_capacity:
+        for fallback in (_first_fit(demand, original, vehicle_capacity, num_vehicles),
+                         _pack_search(demand, original, join, vehicle_capacity, num_vehicles)):
+            if fallback is None:
+                continue
+            fixed, fixed_loads = fallback
+            if ((fixed >= 0) & (fixed < num_vehicles)).all() and (fixed_loads <= vehicle_capacity).all():
+                moves += int((fixed != assign).sum())
+                assign, loads, feasible = fixed, fixed_loads, True
+                break
+
+    count("repair_moves", moves)
+    return assign.tolist(), feasible
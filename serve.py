@@ -0,0 +1,345 @@
+# serve.py
+"""
+Local HTTP/JSON routing service on an asyncio event loop.
+
+    POST /route    instance JSON -> assignments, routes, total_distance
+    POST /predict  instance JSON -> assignments
+    GET  /healthz  liveness, load and prediction cache stats
+    GET  /metrics  Prometheus text: telemetry spans and counters + server gauges
+
+The instance layout is data/raw's (customers, demands, num_vehicles,
+vehicle_capacity, depot) plus optional "mode" (fast, local_search or
+hybrid) and "deadline_ms".
+
+Concurrent requests are coalesced into micro-batches: the batcher collects
+what arrives within BATCH_WINDOW (up to MAX_BATCH instances) and predicts
+them with one predict_assignments_batch call on the event loop. Routing
+(capacity repair, per-truck tours, local search or OR-Tools refinement)
+runs on a fixed-size process pool. At most MAX_PENDING requests are in
+flight; beyond that the service answers 503 with Retry-After instead of
+queueing without bound. A request still unanswered at its deadline gets
+504, and local search and OR-Tools time limits are cut to fit the time
+left.
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+import telemetry
+from construct_routes import (build_routes, build_routes_hybrid, DEPOT, HYBRID_TIME_LIMIT,
+                              LOCAL_SEARCH_BUDGET)
+from inference import cache_stats, predict_assignments_batch, warm_up
+
+HOST = "127.0.0.1"
+PORT = 8000
+WORKERS = 2  # routing processes
+MAX_BATCH = 64  # instances per prediction batch
+BATCH_WINDOW = 0.002  # seconds the batcher waits for a batch to fill
+MAX_PENDING = 256  # requests in flight before new ones are refused
+DEFAULT_DEADLINE_MS = 2000
+MAX_BODY = 8 * 2 ** 20  # bytes
+KEEPALIVE_TIMEOUT = 15  # seconds an idle connection stays open
+MODES = ("fast", "local_search", "hybrid")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def parse_instance(body):
+    """
+    Validate a request body.
+    Returns: dict customers, demands, num_vehicles, vehicle_capacity, depot, mode, deadline
+    Raises: HTTPError 400 on malformed input
+    """
+    try:
+        data = json.loads(body)
+        customers = [[float(lat), float(lon)] for lat, lon in data["customers"]]
+        demands = [int(d) for d in data["demands"]]
+        num_vehicles = int(data.get("num_vehicles", 3))
+        vehicle_capacity = int(data.get("vehicle_capacity", 15))
+        depot = [float(x) for x in data.get("depot") or DEPOT]
+        mode = data.get("mode", "fast")
+        deadline = float(data.get("deadline_ms", DEFAULT_DEADLINE_MS)) / 1000
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Malformed instance: {e!r}")
+    if len(customers) != len(demands):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "customers and demands differ in length")
+    if num_vehicles < 1 or vehicle_capacity < 1 or len(depot) != 2:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Need num_vehicles >= 1, vehicle_capacity >= 1 and a [lat, lon] depot")
+    if mode not in MODES:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"mode must be one of {', '.join(MODES)}")
+    if deadline <= 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "deadline_ms must be positive")
+    return {"customers": customers, "demands": demands, "num_vehicles": num_vehicles,
+            "vehicle_capacity": vehicle_capacity, "depot": depot, "mode": mode, "deadline": deadline}
+
+
+def route_instance(customers, demands, assignments, vehicle_capacity, num_vehicles, depot, mode, deadline):
+    """
+    Routing stage, run in a pool worker. deadline is a time.time() instant.
+    Returns: (routes, total_distance), or None if the deadline passed while
+        the task was queued (its request has already been answered with 504)
+    """
+    seconds_left = deadline - time.time()
+    if seconds_left <= 0:
+        return None
+    if mode == "hybrid":
+        return build_routes_hybrid(customers, demands, assignments, vehicle_capacity, num_vehicles,
+                                   time_limit=min(HYBRID_TIME_LIMIT, seconds_left / 2), depot=depot)
+    return build_routes(customers, demands, assignments, vehicle_capacity, num_vehicles,
+                        local_search=mode == "local_search",
+                        time_budget=min(LOCAL_SEARCH_BUDGET, seconds_left / (2 * num_vehicles)), depot=depot)
+
+
+def _init_worker():
+    # Ctrl-C is for the server process; it shuts the pool down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+async def read_request(reader):
+    """
+    Read one HTTP/1.x request.
+    Returns: (method, path, keep_alive, body), None at end of stream, or an
+        HTTPError to answer (after which the connection is closed)
+    """
+    # readline raises ValueError (from asyncio.LimitOverrunError) for a line
+    # over the stream limit; the connection is closed after the error reply
+    try:
+        line = await reader.readline()
+    except ValueError:
+        return HTTPError(HTTPStatus.REQUEST_URI_TOO_LONG, "Request line too long")
+    if not line:
+        return None
+    headers = {}
+    while True:
+        try:
+            header = await reader.readline()
+        except ValueError:
+            return HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header line too long")
+        if header in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = header.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        method, path, version = line.decode("latin-1").split()
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        return HTTPError(HTTPStatus.BAD_REQUEST, "Malformed HTTP request")
+    if length > MAX_BODY:
+        return HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Body over {MAX_BODY} bytes")
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+    body = await reader.readexactly(length) if length > 0 else b""
+    return method, path, keep_alive, body
+
+
+class Batcher:
+    """Coalesces concurrent predictions into predict_assignments_batch calls."""
+
+    def __init__(self, max_batch=MAX_BATCH, window=BATCH_WINDOW):
+        self.max_batch = max_batch
+        self.window = window
+        self.queue = asyncio.Queue()
+
+    async def predict(self, customers, demands):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((customers, demands, future))
+        return await future
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.window > 0 and self.queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            live = [item for item in batch if not item[2].done()]  # drop timed-out requests
+            if not live:
+                continue
+            try:
+                results = predict_assignments_batch([(customers, demands) for customers, demands, _ in live])
+            except Exception as e:
+                for _, _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, future), assignments in zip(live, results):
+                if not future.done():
+                    future.set_result(assignments)
+            telemetry.count("prediction_batches")
+            telemetry.count("batched_instances", len(live))
+
+
+class RoutingServer:
+    def __init__(self, pool=None, max_pending=MAX_PENDING, max_batch=MAX_BATCH, batch_window=BATCH_WINDOW):
+        self.pool = pool
+        self.max_pending = max_pending
+        self.batcher = Batcher(max_batch, batch_window)
+        self.pending = 0
+        self.started = time.time()
+
+    async def solve(self, instance, deadline_at, with_routes):
+        start = time.perf_counter()
+        assignments = await self.batcher.predict(instance["customers"], instance["demands"])
+        predicted = time.perf_counter()
+        result = {"assignments": assignments}
+        if with_routes:
+            args = (instance["customers"], instance["demands"], assignments, instance["vehicle_capacity"],
+                    instance["num_vehicles"], instance["depot"], instance["mode"],
+                    time.time() + deadline_at - predicted)
+            if self.pool is None:
+                routed = route_instance(*args)
+            else:
+                routed = await asyncio.get_running_loop().run_in_executor(self.pool, route_instance, *args)
+            if routed is None:
+                raise asyncio.TimeoutError
+            result.update(routes=routed[0], total_distance=routed[1])
+        result["timings_ms"] = {"predict": round((predicted - start) * 1000, 3),
+                                "total": round((time.perf_counter() - start) * 1000, 3)}
+        return result
+
+    async def handle_solve(self, body, with_routes):
+        instance = parse_instance(body)
+        if self.pending >= self.max_pending:
+            telemetry.count("requests_rejected")
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Server busy", {"Retry-After": "1"})
+        self.pending += 1
+        try:
+            deadline_at = time.perf_counter() + instance["deadline"]
+            with telemetry.span("serve_route" if with_routes else "serve_predict"):
+                return await asyncio.wait_for(self.solve(instance, deadline_at, with_routes), instance["deadline"])
+        except asyncio.TimeoutError:
+            telemetry.count("deadline_exceeded")
+            raise HTTPError(HTTPStatus.GATEWAY_TIMEOUT, "Deadline exceeded")
+        finally:
+            self.pending -= 1
+
+    def health(self):
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "pending": self.pending,
+            "queued_predictions": self.batcher.queue.qsize(),
+            "workers": self.pool._max_workers if self.pool is not None else 0,
+            "prediction_cache": cache_stats(),
+        }
+
+    def metrics(self):
+        prefix = telemetry.METRIC_PREFIX
+        stats = cache_stats()
+        gauges = {
+            "serve_pending_requests": self.pending,
+            "serve_queued_predictions": self.batcher.queue.qsize(),
+            "prediction_cache_entries": stats["entries"],
+        }
+        lines = [telemetry.prometheus_text().rstrip("\n")]
+        for name, value in gauges.items():
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def dispatch(self, method, path, body):
+        """Returns: (status, content type, body bytes, extra headers)"""
+        telemetry.count("http_requests")
+        routes = {
+            "/route": ("POST", lambda: self.handle_solve(body, True)),
+            "/predict": ("POST", lambda: self.handle_solve(body, False)),
+            "/healthz": ("GET", None),
+            "/metrics": ("GET", None),
+        }
+        path = path.split("?", 1)[0]
+        if path not in routes:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No such endpoint: {path}")
+        if method != routes[path][0]:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{path} takes {routes[path][0]}",
+                            {"Allow": routes[path][0]})
+        if path == "/metrics":
+            return HTTPStatus.OK, "text/plain; version=0.0.4", self.metrics().encode(), {}
+        payload = self.health() if path == "/healthz" else await routes[path][1]()
+        return HTTPStatus.OK, "application/json", json.dumps(payload).encode(), {}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if request is None:
+                    break
+                keep_alive = True
+                try:
+                    if isinstance(request, HTTPError):
+                        keep_alive = False
+                        raise request
+                    method, path, keep_alive, body = request
+                    status, content_type, payload, extra = await self.dispatch(method, path, body)
+                except HTTPError as e:
+                    status, content_type, extra = e.status, "application/json", e.headers
+                    payload = json.dumps({"error": str(e)}).encode()
+                except Exception as e:  # Keep serving other requests
+                    status, content_type, extra = HTTPStatus.INTERNAL_SERVER_ERROR, "application/json", {}
+                    payload = json.dumps({"error": repr(e)}).encode()
+
+                head = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}",
+                        f"Content-Length: {len(payload)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head += [f"{name}: {value}" for name, value in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        batcher = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        print(f"✅ Serving on http://{host}:{port} (POST /route, /predict; GET /healthz, /metrics)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP/JSON routing service")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Routing processes (0: route on the event loop)")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW * 1000)
+    args = parser.parse_args(argv)
+
+    telemetry.enable()
+    warm_up()
+    pool = None
+    if args.workers > 0:
+        pool = ProcessPoolExecutor(args.workers, initializer=_init_worker)
+        # Start the workers now, before the event loop exists, rather than on the first request
+        for future in [pool.submit(time.sleep, 0) for _ in range(args.workers)]:
+            future.result()
+    server = RoutingServer(pool, args.max_pending, args.max_batch, args.batch_window_ms / 1000)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,34 +5,37 @@ Uses Euclidean distance with km scaling.
 """
 
 from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
 import json
 import os
+import time
 import numpy as np
-import joblib
+from distance import distance_matrix
+from dataset_store import LabelStore, STORE_DIR
+from telemetry import count, is_enabled, traced
 
 INPUT_DIR = "data/raw"
 OUTPUT_DIR = "data/processed"
 OUTPUT_FILE = f"{OUTPUT_DIR}/labeled_dataset.joblib"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+CHECKPOINT_FILE = f"{OUTPUT_DIR}/labeled_dataset.ckpt.jsonl"
+CHUNK_SIZE = 8  # Instances handed to a worker per round-trip
+MIN_TIME_LIMIT = 0.05  # seconds; floor for any one instance's share of a budget
+STAGNATION_FRACTION = 0.25  # stop after this share of the time limit without progress
+IMPROVEMENT_TOL = 1e-3  # relative objective gain that counts as progress
+PROBE_FRACTION = 0.3  # share of a batch budget spent on a first pass over every instance
+FLUSH_SECONDS = 30  # label store flushed (and its instances checkpointed) at least this often
 
 def create_distance_matrix(customers, depot=(0,0)):
-    locations = [depot] + customers
-    n = len(locations)
-    dist_matrix = np.zeros((n, n))
-    for i in range(n):
-        for j in range(n):
-            dx = (locations[i][0] - locations[j][0]) * 111
-            dy = (locations[i][1] - locations[j][1]) * 111 * np.cos(np.radians(locations[i][0]))
-            dist_matrix[i][j] = int(np.hypot(dx, dy) * 100)
-    return dist_matrix.astype(int).tolist()
+    return distance_matrix(customers, depot, scaled=True).tolist()
 
-def solve_cvrp(customers, demands, num_vehicles=3, vehicle_capacity=15):
-    if any(d > vehicle_capacity for d in demands):
-        return None
-    if sum(demands) > num_vehicles * vehicle_capacity:
-        return None
-
-    dist_matrix = create_distance_matrix(customers)
+def create_routing_model(customers, demands, num_vehicles=3, vehicle_capacity=15, depot=(0,0)):
+    """
+    OR-Tools CVRP model over [depot] + customers.
+    Returns: (manager, routing, callbacks); keep callbacks alive while solving.
+    """
+    dist_matrix = create_distance_matrix(customers, depot)
     manager = pywrapcp.RoutingIndexManager(len(dist_matrix), num_vehicles, 0)
     routing = pywrapcp.RoutingModel(manager)
 
@@ -55,6 +58,39 @@ def solve_cvrp(customers, demands, num_vehicles=3, vehicle_capacity=15):
         True,
         'Capacity'
     )
+    return manager, routing, (distance_callback, demand_callback)
+
+
+def extract_routes(manager, routing, solution, num_vehicles):
+    """Per-vehicle lists of customer ids (0-based) in visit order."""
+    routes = []
+    for vehicle_id in range(num_vehicles):
+        route = []
+        index = routing.Start(vehicle_id)
+        while not routing.IsEnd(index):
+            node_index = manager.IndexToNode(index)
+            if node_index != 0:
+                route.append(node_index - 1)
+            index = solution.Value(routing.NextVar(index))
+        routes.append(route)
+    return routes
+
+
+def _count_solutions(routing):
+    """Feed the ortools_solutions counter, only while telemetry is recording."""
+    if is_enabled():
+        routing.AddAtSolutionCallback(lambda: count("ortools_solutions"))
+
+
+@traced()
+def solve_cvrp(customers, demands, num_vehicles=3, vehicle_capacity=15):
+    if any(d > vehicle_capacity for d in demands):
+        return None
+    if sum(demands) > num_vehicles * vehicle_capacity:
+        return None
+
+    manager, routing, _callbacks = create_routing_model(customers, demands, num_vehicles, vehicle_capacity)
+    _count_solutions(routing)
 
     params = pywrapcp.DefaultRoutingSearchParameters()
     params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
@@ -65,34 +101,413 @@ def solve_cvrp(customers, demands, num_vehicles=3, vehicle_capacity=15):
         return None
 
     assignments = {}
-    for vehicle_id in range(num_vehicles):
-        index = routing.Start(vehicle_id)
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            if node_index != 0:
-                customer_id = node_index - 1
-                assignments[customer_id] = vehicle_id
-            index = solution.Value(routing.NextVar(index))
+    for vehicle_id, route in enumerate(extract_routes(manager, routing, solution, num_vehicles)):
+        for customer_id in route:
+            assignments[customer_id] = vehicle_id
     return assignments
 
-if __name__ == "__main__":
-    dataset = []
-    for filename in sorted(os.listdir(INPUT_DIR)):
-        if not filename.endswith(".json"): continue
-        path = os.path.join(INPUT_DIR, filename)
-        with open(path, "r") as f:
-            data = json.load(f)
-        try:
-            # Use dynamic num_vehicles and capacity
-            num_vehicles = data.get("num_vehicles", 3)
-            capacity = data.get("vehicle_capacity", 15)
-            assignments = solve_cvrp(data["customers"], data["demands"], num_vehicles, capacity)
-            if assignments is None: continue
-            features = [[c[0], c[1], d] for c, d in zip(data["customers"], data["demands"])]
-            labels = [assignments.get(i, 0) for i in range(len(data["customers"]))]
-            dataset.append({"features": features, "labels": labels})
-        except Exception as e:
-            print(f"Failed: {filename}, {e}")
+
+@traced()
+def solve_cvrp_warm(customers, demands, initial_routes, num_vehicles=3, vehicle_capacity=15,
+                    depot=(0,0), time_limit=0.5):
+    """
+    Guided local search started from initial_routes (per-vehicle lists of
+    0-based customer ids) instead of a cold PATH_CHEAPEST_ARC construction.
+    Falls back to a cold start if the initial routes are not a valid solution.
+    Returns: per-vehicle customer id routes, or None if no solution is found
+    """
+    if any(d > vehicle_capacity for d in demands):
+        return None
+    if sum(demands) > num_vehicles * vehicle_capacity:
+        return None
+
+    manager, routing, _callbacks = create_routing_model(customers, demands, num_vehicles, vehicle_capacity, depot)
+    _count_solutions(routing)
+
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    params.time_limit.FromMilliseconds(max(1, int(time_limit * 1000)))
+
+    routing.CloseModelWithParameters(params)
+    padded = [list(r) for r in initial_routes] + [[] for _ in range(num_vehicles - len(initial_routes))]
+    initial = routing.ReadAssignmentFromRoutes(
+        [[manager.NodeToIndex(c + 1) for c in route] for route in padded], True)
+    if initial is not None:
+        solution = routing.SolveFromAssignmentWithParameters(initial, params)
+    else:
+        solution = routing.SolveWithParameters(params)
+
+    if not solution:
+        return None
+    return extract_routes(manager, routing, solution, num_vehicles)
+
+
+def create_native_model(customers, demands, num_vehicles=3, vehicle_capacity=15, depot=(0,0)):
+    """
+    Same model as create_routing_model, but the distance matrix and demands
+    are registered as native OR-Tools arrays, so arc and demand lookups
+    never call back into Python.
+    Returns: (manager, routing)
+    """
+    dist_matrix = create_distance_matrix(customers, depot)
+    manager = pywrapcp.RoutingIndexManager(len(dist_matrix), num_vehicles, 0)
+    routing = pywrapcp.RoutingModel(manager)
+    transit_index = routing.RegisterTransitMatrix(dist_matrix)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_index)
+    demand_index = routing.RegisterUnaryTransitVector([0] + [int(d) for d in demands])
+    routing.AddDimensionWithVehicleCapacity(
+        demand_index,
+        0,
+        [vehicle_capacity] * num_vehicles,
+        True,
+        'Capacity'
+    )
+    return manager, routing
+
+
+@traced()
+def solve_cvrp_anytime(customers, demands, num_vehicles=3, vehicle_capacity=15, depot=(0,0),
+                       time_limit=3.0, initial_routes=None):
+    """
+    Guided local search on the native model that stops early once the
+    objective has not improved by IMPROVEMENT_TOL for STAGNATION_FRACTION of
+    time_limit. Starts from initial_routes (per-vehicle 0-based customer ids)
+    when given.
+    Returns: None if infeasible, else dict with routes, objective,
+        first_objective, solutions, seconds and stopped
+        ("stagnation" or "time_limit")
+    """
+    if any(d > vehicle_capacity for d in demands):
+        return None
+    if sum(demands) > num_vehicles * vehicle_capacity:
+        return None
+
+    start = time.perf_counter()
+    manager, routing = create_native_model(customers, demands, num_vehicles, vehicle_capacity, depot)
+    patience = max(MIN_TIME_LIMIT, STAGNATION_FRACTION * time_limit)
+    progress = {"first": None, "best": None, "improved_at": start, "solutions": 0, "stopped": "time_limit"}
+
+    def on_solution():
+        now = time.perf_counter()
+        cost = routing.CostVar().Max()
+        progress["solutions"] += 1
+        if progress["first"] is None:
+            progress["first"] = cost
+        if progress["best"] is None or cost < progress["best"] * (1 - IMPROVEMENT_TOL):
+            progress["best"] = cost
+            progress["improved_at"] = now
+        elif now - progress["improved_at"] > patience:
+            progress["stopped"] = "stagnation"
+            routing.solver().FinishCurrentSearch()
+    routing.AddAtSolutionCallback(on_solution)
+
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    params.time_limit.FromMilliseconds(max(1, int(time_limit * 1000)))
+
+    initial = None
+    if initial_routes is not None:
+        routing.CloseModelWithParameters(params)
+        padded = [list(r) for r in initial_routes] + [[] for _ in range(num_vehicles - len(initial_routes))]
+        initial = routing.ReadAssignmentFromRoutes(
+            [[manager.NodeToIndex(c + 1) for c in route] for route in padded], True)
+    if initial is not None:
+        solution = routing.SolveFromAssignmentWithParameters(initial, params)
+    else:
+        solution = routing.SolveWithParameters(params)
+
+    count("ortools_solutions", progress["solutions"])
+    if not solution:
+        return None
+    objective = solution.ObjectiveValue()
+    return {
+        "routes": extract_routes(manager, routing, solution, num_vehicles),
+        "objective": objective,
+        "first_objective": progress["first"] if progress["first"] is not None else objective,
+        "solutions": progress["solutions"],
+        "seconds": time.perf_counter() - start,
+        "stopped": progress["stopped"],
+    }
+
+
+def instance_weight(num_customers):
+    """Relative solve effort of an instance: local search passes grow ~ n log n."""
+    return num_customers * np.log2(num_customers + 2)
+
+
+def allocate_budget(weights, budget, min_seconds=MIN_TIME_LIMIT):
+    """Split budget seconds in proportion to weights, with a per-share floor."""
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(weights) == 0:
+        return []
+    total = weights.sum()
+    shares = budget * weights / total if total > 0 else np.full(len(weights), budget / len(weights))
+    return np.maximum(shares, min_seconds).tolist()
+
+
+def solve_batch(instances, budget, num_vehicles=3, vehicle_capacity=15, depot=(0,0)):
+    """
+    Solve instances (dicts with customers, demands and optionally
+    num_vehicles / vehicle_capacity) within roughly budget seconds in total.
+
+    A first pass spends PROBE_FRACTION of the budget, shared by size. Every
+    instance that did not stop on stagnation is then re-solved from its
+    first-pass routes, with the remaining budget shared by size times the
+    relative gain it made in the first pass; time an instance leaves unused
+    rolls over to the ones after it.
+    Returns: list of solve_cvrp_anytime results (None where infeasible)
+    """
+    deadline = time.perf_counter() + budget
+
+    def solve(inst, limit, initial_routes=None):
+        return solve_cvrp_anytime(inst["customers"], inst["demands"],
+                                  inst.get("num_vehicles", num_vehicles),
+                                  inst.get("vehicle_capacity", vehicle_capacity),
+                                  depot, limit, initial_routes)
+
+    sizes = [instance_weight(len(inst["customers"])) for inst in instances]
+    probes = allocate_budget(sizes, budget * PROBE_FRACTION)
+    results = [solve(inst, limit) for inst, limit in zip(instances, probes)]
+
+    pending = []
+    for i, result in enumerate(results):
+        # An empty instance weighs 0: it has nothing to improve and would
+        # leave nothing to split the budget by.
+        if result is not None and result["stopped"] == "time_limit" and sizes[i] > 0:
+            gain = (result["first_objective"] - result["objective"]) / max(result["first_objective"], 1)
+            pending.append((sizes[i] * (gain + IMPROVEMENT_TOL), i))
+    pending.sort(reverse=True)  # most promising first, so they cannot be starved
+
+    remaining_weight = sum(w for w, _ in pending)
+    for weight, i in pending:
+        remaining = deadline - time.perf_counter()
+        limit = remaining * weight / remaining_weight
+        remaining_weight -= weight
+        if limit < MIN_TIME_LIMIT:
             continue
-    joblib.dump(dataset, OUTPUT_FILE)
-    print(f"✅ Labels saved to {OUTPUT_FILE}")
\ No newline at end of file
+        result = solve(instances[i], limit, results[i]["routes"])
+        if result is not None and result["objective"] < results[i]["objective"]:
+            result["first_objective"] = results[i]["first_objective"]
+            result["seconds"] += results[i]["seconds"]
+            results[i] = result
+    return results
+
+
+def label_instance(filename, time_limit=None):
+    """
+    Solve one raw instance file, with solve_cvrp, or with the anytime
+    solver when time_limit (seconds) is given.
+    Returns: (filename, {"features", "labels"} or None if infeasible/failed)
+    """
+    path = os.path.join(INPUT_DIR, filename)
+    with open(path, "r") as f:
+        data = json.load(f)
+    try:
+        # Use dynamic num_vehicles and capacity
+        num_vehicles = data.get("num_vehicles", 3)
+        capacity = data.get("vehicle_capacity", 15)
+        if time_limit is None:
+            assignments = solve_cvrp(data["customers"], data["demands"], num_vehicles, capacity)
+        else:
+            result = solve_cvrp_anytime(data["customers"], data["demands"], num_vehicles, capacity,
+                                        time_limit=time_limit)
+            assignments = None if result is None else {
+                customer_id: vehicle_id
+                for vehicle_id, route in enumerate(result["routes"]) for customer_id in route}
+        if assignments is None:
+            return filename, None
+        features = [[c[0], c[1], d] for c, d in zip(data["customers"], data["demands"])]
+        labels = [assignments.get(i, 0) for i in range(len(data["customers"]))]
+        return filename, {"features": features, "labels": labels}
+    except Exception as e:
+        print(f"Failed: {filename}, {e}")
+        return filename, None
+
+
+def file_digest(filename):
+    """Content hash of a raw instance file; checkpoint entries only count while it matches."""
+    with open(os.path.join(INPUT_DIR, filename), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_checkpoint(checkpoint_file=CHECKPOINT_FILE):
+    """
+    Read the checkpoint shard: one {"file", "digest", "rows"} entry per
+    labelled instance, in the order its rows were appended to the label
+    store (rows is 0 for instances with no solution).
+    Returns: list of entries
+    """
+    entries = []
+    if not os.path.exists(checkpoint_file):
+        return entries
+    valid = 0
+    with open(checkpoint_file, "r+b") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn last line from a killed run: drop it so appends stay clean
+                f.truncate(valid)
+                break
+            entries.append(entry)
+            valid += len(line)
+    return entries
+
+
+def resume_store(filenames, checkpoint_file=CHECKPOINT_FILE, store_dir=STORE_DIR):
+    """
+    Open the label store left by an earlier run for appending.
+    Checkpoint entries whose instance file has changed or gone are dropped
+    (those instances are re-solved), as are store rows that no entry
+    accounts for (a run killed between a store flush and its checkpoint
+    write). The kept rows are then streamed into a fresh store.
+    Returns: (LabelStore, set of filenames already labelled)
+    """
+    pending = checkpoint_file + ".tmp"
+    if os.path.exists(pending):
+        # Killed while reconciling: store and checkpoint may disagree, so start over
+        os.remove(pending)
+        open(checkpoint_file, "w").close()
+        return LabelStore.create(store_dir), set()
+
+    entries = load_checkpoint(checkpoint_file)
+    store = LabelStore(store_dir)
+    wanted = set(filenames)
+    kept, ranges, start = [], [], 0
+    for entry in entries:
+        rows = entry.get("rows")
+        if rows is None or start + rows > len(store):
+            break  # older checkpoint format, or rows lost with the run that wrote it
+        name = entry["file"]
+        if name in wanted and file_digest(name) == entry.get("digest"):
+            kept.append(entry)
+            ranges.append((start, start + rows))
+        start += rows
+
+    if len(kept) < len(entries) or start < len(store):
+        print(f"Checkpoint: dropping {len(entries) - len(kept)} stale instance(s) "
+              f"and {len(store) - sum(e['rows'] for e in kept)} stored row(s)")
+        with open(pending, "w") as f:
+            f.writelines(json.dumps(e) + "\n" for e in kept)
+        store = store.keep_rows(ranges, instances=sum(1 for e in kept if e["rows"]))
+        os.replace(pending, checkpoint_file)
+    return store, {e["file"] for e in kept}
+
+
+def instance_time_limits(filenames, budget, workers=None):
+    """
+    Per-instance time limits that share budget seconds of wall clock across
+    workers processes, in proportion to instance_weight.
+    """
+    sizes = []
+    for filename in filenames:
+        with open(os.path.join(INPUT_DIR, filename), "r") as f:
+            sizes.append(instance_weight(len(json.load(f)["customers"])))
+    workers = 1 if workers == 1 else (workers or os.cpu_count() or 1)
+    return allocate_budget(sizes, budget * workers)
+
+
+def iter_labels(filenames, workers=None, budget=None):
+    """
+    Solve instances across a process pool. Yields (filename, record or None
+    if unsolvable) in the order of filenames. With budget (seconds), the
+    anytime solver is used and the budget is shared by instance size.
+    """
+    limits = [None] * len(filenames) if budget is None else instance_time_limits(filenames, budget, workers)
+    if workers == 1:
+        yield from map(label_instance, filenames, limits)
+        return
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        yield from pool.map(label_instance, filenames, limits, chunksize=CHUNK_SIZE)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def label_instances(filenames, workers=None, budget=None):
+    """Like iter_labels, but returns the solved records as a list."""
+    return [record for _, record in iter_labels(filenames, workers, budget) if record is not None]
+
+
+def label_to_store(filenames, workers=None, checkpoint_file=CHECKPOINT_FILE, resume=True, budget=None,
+                   store_dir=STORE_DIR):
+    """
+    Label instances into the label store, checkpointing each one (filename,
+    content digest, row count) once the store has flushed its rows. A rerun
+    appends only the missing instances to the store left behind.
+    Returns: the closed LabelStore
+    """
+    os.makedirs(os.path.dirname(checkpoint_file) or ".", exist_ok=True)
+    if resume:
+        store, done = resume_store(filenames, checkpoint_file, store_dir)
+    else:
+        store, done = LabelStore.create(store_dir), set()
+    todo = [name for name in filenames if name not in done]
+    if done:
+        print(f"Resuming: {len(filenames) - len(todo)} of {len(filenames)} instances already labelled")
+    digests = iter([file_digest(name) for name in todo])  # as read before solving
+
+    unsaved = []  # checkpoint entries whose rows are still buffered in the store
+    last_flush = time.perf_counter()
+    with open(checkpoint_file, "a" if resume else "w") as ckpt:
+        for filename, record in iter_labels(todo, workers, budget):
+            shards = len(store.shards)
+            rows = 0
+            if record is not None:
+                store.append(record["features"], record["labels"])
+                rows = len(record["labels"])
+            unsaved.append({"file": filename, "digest": next(digests), "rows": rows})
+            flushed = len(store.shards) != shards
+            if not flushed and time.perf_counter() - last_flush >= FLUSH_SECONDS:
+                store.flush()
+                flushed = True
+            if flushed:
+                ckpt.writelines(json.dumps(e) + "\n" for e in unsaved)
+                ckpt.flush()
+                unsaved.clear()
+                last_flush = time.perf_counter()
+        store.close()
+        ckpt.writelines(json.dumps(e) + "\n" for e in unsaved)
+    return store
+
+
+def stored_records(store, checkpoint_file=CHECKPOINT_FILE):
+    """The store's rows split back into per-instance records (the legacy in-memory list)."""
+    chunks = list(store.iter_chunks())
+    X = np.concatenate([c[0] for c in chunks]) if chunks else np.empty((0, 3), dtype=np.float32)
+    y = np.concatenate([c[1] for c in chunks]) if chunks else np.empty(0, dtype=np.int32)
+    records, start = [], 0
+    for entry in load_checkpoint(checkpoint_file):
+        if entry["rows"]:
+            end = start + entry["rows"]
+            records.append({"features": X[start:end].tolist(), "labels": y[start:end].tolist()})
+            start = end
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=None, help="Solver processes (default: all cores)")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore the existing checkpoint shard")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="Checkpoint shard path")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Total solve time in seconds, shared across instances by size "
+                             "(default: a flat 3 s limit per instance)")
+    parser.add_argument("--joblib", action="store_true",
+                        help=f"Also write the in-memory list format to {OUTPUT_FILE} (float32 features, as stored)")
+    args = parser.parse_args(argv)
+
+    filenames = [name for name in sorted(os.listdir(INPUT_DIR)) if name.endswith(".json")]
+    store = label_to_store(filenames, args.workers, args.checkpoint, resume=not args.no_resume,
+                           budget=args.budget)
+    print(f"✅ {len(store)} labelled customers saved to {STORE_DIR}/")
+    if args.joblib:
+        import joblib
+
+        joblib.dump(stored_records(store, args.checkpoint), OUTPUT_FILE)
+        print(f"✅ Labels saved to {OUTPUT_FILE}")
+
+if __name__ == "__main__":
+    main()
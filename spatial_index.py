@@ -0,0 +1,138 @@
+# spatial_index.py
+"""
+Uniform-grid spatial index for nearest-neighbour routing heuristics.
+Points live in square cells of a planar grid; a query scans rings of cells
+outward from the query's cell and stops once no unscanned cell can hold a
+closer point. Points can be removed as they are visited, and the grid is
+rebuilt at a coarser size as it empties, so a full nearest-neighbour tour
+costs close to O(n) queries of O(1) cells each.
+"""
+
+import numpy as np
+from distance import KM_PER_DEGREE
+
+POINTS_PER_CELL = 2  # target occupancy when the grid is (re)built
+REBUILD_FRACTION = 0.25  # rebuild once this share of the built points is left
+
+
+def project(points, ref_lat):
+    """(lat, lon) degrees -> planar (x, y) km, equirectangular about ref_lat."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return np.column_stack([
+        points[:, 1] * KM_PER_DEGREE * np.cos(np.radians(ref_lat)),
+        points[:, 0] * KM_PER_DEGREE,
+    ])
+
+
+class SpatialIndex:
+    """
+    Grid over planar points supporting removal and k-nearest queries.
+    Distances are Euclidean in the coordinates given (use project() for
+    lat/lon). Indices refer to rows of the original points array.
+    """
+
+    def __init__(self, points, cell_size=None):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.alive = np.ones(len(self.points), dtype=bool)
+        self._count = len(self.points)
+        self._build(np.arange(len(self.points)), cell_size)
+
+    def _build(self, ids, cell_size=None):
+        pts = self.points[ids]
+        self._built = len(ids)
+        if len(ids) == 0:
+            self.origin, self.cell, self.shape, self.cells = np.zeros(2), 1.0, (1, 1), [[]]
+            return
+        lo, hi = pts.min(axis=0), pts.max(axis=0)
+        if cell_size is None:
+            area = max(float(np.prod(hi - lo)), 1e-12)
+            cell_size = np.sqrt(area * POINTS_PER_CELL / len(ids))
+            cell_size = max(cell_size, float((hi - lo).max()) / 1024, 1e-9)  # cap the grid at 1024 per side
+        self.origin, self.cell = lo, float(cell_size)
+        cx, cy = self._cell_of(pts).T
+        self.shape = (int(cx.max()) + 1, int(cy.max()) + 1)
+        self.cells = [[] for _ in range(self.shape[0] * self.shape[1])]
+        for i, flat in zip(ids.tolist(), (cx * self.shape[1] + cy).tolist()):
+            self.cells[flat].append(i)
+
+    def _cell_of(self, pts):
+        return np.floor((pts - self.origin) / self.cell).astype(np.int64)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, i):
+        return bool(self.alive[i])
+
+    def remove(self, i):
+        """Remove point i (no-op if already removed)."""
+        if not self.alive[i]:
+            return
+        self.alive[i] = False
+        self._count -= 1
+        cx, cy = self._cell_of(self.points[i:i + 1])[0]
+        self.cells[cx * self.shape[1] + cy].remove(i)
+        if self._count and self._count < self._built * REBUILD_FRACTION:
+            self._build(np.flatnonzero(self.alive))
+
+    def _ring(self, qx, qy, r):
+        nx, ny = self.shape
+        if r == 0:
+            if 0 <= qx < nx and 0 <= qy < ny:
+                yield qx * ny + qy
+            return
+        for x in range(max(qx - r, 0), min(qx + r, nx - 1) + 1):
+            for y in (qy - r, qy + r):
+                if 0 <= y < ny:
+                    yield x * ny + y
+        for y in range(max(qy - r + 1, 0), min(qy + r - 1, ny - 1) + 1):
+            for x in (qx - r, qx + r):
+                if 0 <= x < nx:
+                    yield x * ny + y
+
+    def nearest(self, point, k=1):
+        """
+        The k nearest remaining points to point.
+        Returns: (indices, distances), both sorted by distance
+        """
+        k = min(k, self._count)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        q = np.asarray(point, dtype=np.float64).reshape(2)
+        qx, qy = self._cell_of(q[None, :])[0]
+        nx, ny = self.shape
+        # Rings before min_r miss the grid entirely (query outside it);
+        # beyond max_r every cell of the grid has been scanned
+        min_r = max(-qx, qx - (nx - 1), -qy, qy - (ny - 1), 0)
+        max_r = max(qx, nx - 1 - qx, qy, ny - 1 - qy, 0)
+        found = []
+        for r in range(min_r, max_r + 1):
+            for flat in self._ring(qx, qy, r):
+                found.extend(self.cells[flat])
+            if len(found) >= k:
+                ids = np.array(found)
+                d = np.hypot(*(self.points[ids] - q).T)
+                # Cells in ring r + 1 are at least r cell widths away
+                # (a query outside the grid is only farther from them)
+                if np.partition(d, k - 1)[k - 1] <= r * self.cell:
+                    break
+        ids = np.array(found)
+        d = np.hypot(*(self.points[ids] - q).T)
+        order = np.argsort(d, kind="stable")[:k]
+        return ids[order], d[order]
+
+
+def nearest_neighbor_order(points, start):
+    """
+    Greedy nearest-neighbour visiting order of all points, from start.
+    Returns: list of point indices
+    """
+    index = SpatialIndex(points)
+    order = []
+    current = np.asarray(start, dtype=np.float64)
+    while len(index):
+        (i,), _ = index.nearest(current)
+        index.remove(i)
+        order.append(int(i))
+        current = index.points[i]
+    return order
@@ -0,0 +1,248 @@
+# telemetry.py
+"""
+Timing spans and counters for the routing hot paths.
+Nothing is recorded until a recorder is active: span() then hands back one
+shared no-op context manager and count() returns after a single check, so
+instrumented code costs a function call when telemetry is off. enable() (or
+QROUTENET_TELEMETRY=1) turns on the process-wide recorder; capture() opens a
+private one for a block of code, e.g. one dashboard solve. Recordings export
+as Chrome trace-event JSON (chrome://tracing, Perfetto) or a Prometheus text
+snapshot. Spans opened in worker processes are not collected.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+ENV_VAR = "QROUTENET_TELEMETRY"
+MAX_EVENTS = 100_000  # spans kept per recorder for trace export; oldest dropped first
+METRIC_PREFIX = "qroutenet"
+
+_origin = time.perf_counter()  # trace timestamps are microseconds since import
+_active = ()  # recorders currently receiving spans and counters (replaced, never mutated)
+_active_lock = threading.Lock()
+
+
+class Recorder:
+    """
+    Spans and counters collected while the recorder is active.
+    Args:
+        thread: only record spans and counts made on this thread id
+            (default: every thread)
+        max_events: trace events kept; per-span totals are always exact
+    """
+
+    def __init__(self, thread=None, max_events=MAX_EVENTS):
+        self.thread = thread
+        self.events = deque(maxlen=max_events)
+        self.spans = {}  # name -> [calls, seconds]
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, end, tid, args):
+        with self._lock:
+            self.events.append((name, start, end, tid, args))
+            totals = self.spans.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += end - start
+
+    def add(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self.spans.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        """Returns: dict spans {name: {calls, seconds}} and counters {name: value}"""
+        with self._lock:
+            return {
+                "spans": {name: {"calls": calls, "seconds": round(seconds, 6)}
+                          for name, (calls, seconds) in self.spans.items()},
+                "counters": dict(self.counters),
+            }
+
+    def chrome_trace(self):
+        """Trace-event JSON object: one complete ("X") event per span, counters at the end."""
+        pid = os.getpid()
+        with self._lock:
+            events = [{
+                "name": name, "cat": METRIC_PREFIX, "ph": "X", "pid": pid, "tid": tid,
+                "ts": round((start - _origin) * 1e6, 3), "dur": round((end - start) * 1e6, 3),
+                "args": args or {},
+            } for name, start, end, tid, args in self.events]
+            end = max((e[2] for e in self.events), default=time.perf_counter())
+            events.extend({
+                "name": name, "cat": METRIC_PREFIX, "ph": "C", "pid": pid, "tid": 0,
+                "ts": round((end - _origin) * 1e6, 3), "args": {"value": value},
+            } for name, value in self.counters.items())
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def prometheus_text(self):
+        """Prometheus text exposition format snapshot of span totals and counters."""
+        snap = self.snapshot()
+        lines = [
+            f"# HELP {METRIC_PREFIX}_span_seconds_total Wall-clock seconds spent in each instrumented span.",
+            f"# TYPE {METRIC_PREFIX}_span_seconds_total counter",
+        ]
+        lines += [f'{METRIC_PREFIX}_span_seconds_total{{span="{name}"}} {s["seconds"]}'
+                  for name, s in sorted(snap["spans"].items())]
+        lines += [
+            f"# HELP {METRIC_PREFIX}_span_calls_total Completed calls of each instrumented span.",
+            f"# TYPE {METRIC_PREFIX}_span_calls_total counter",
+        ]
+        lines += [f'{METRIC_PREFIX}_span_calls_total{{span="{name}"}} {s["calls"]}'
+                  for name, s in sorted(snap["spans"].items())]
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+            lines.append(f"{METRIC_PREFIX}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+_default = Recorder()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        tid = threading.get_ident()
+        for recorder in _active:
+            if recorder.thread is None or recorder.thread == tid:
+                recorder.add_span(self.name, self.start, end, tid, self.args)
+        return False
+
+
+def span(name, **args):
+    """Context manager timing its block as span name; args go into the trace."""
+    if not _active:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator: time every call of the function as a span (default: its name)."""
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return fn(*args, **kwargs)
+            with _Span(label, None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, value=1):
+    """Add value to counter name."""
+    if not _active:
+        return
+    tid = threading.get_ident()
+    for recorder in _active:
+        if recorder.thread is None or recorder.thread == tid:
+            recorder.add(name, value)
+
+
+def is_enabled():
+    """True if any recorder is active (worth doing extra work to feed counters)."""
+    return bool(_active)
+
+
+def _attach(recorder):
+    global _active
+    with _active_lock:
+        if recorder not in _active:
+            _active = _active + (recorder,)
+
+
+def _detach(recorder):
+    global _active
+    with _active_lock:
+        _active = tuple(r for r in _active if r is not recorder)
+
+
+def enable():
+    """Start recording into the process-wide recorder."""
+    _attach(_default)
+
+
+def disable():
+    _detach(_default)
+
+
+@contextmanager
+def capture(this_thread=True):
+    """
+    Record the enclosed block into a fresh Recorder, independently of
+    enable(). With this_thread, spans from other threads are ignored.
+    Yields: the Recorder
+    """
+    recorder = Recorder(threading.get_ident() if this_thread else None)
+    _attach(recorder)
+    try:
+        yield recorder
+    finally:
+        _detach(recorder)
+
+
+def reset():
+    _default.reset()
+
+
+def snapshot():
+    return _default.snapshot()
+
+
+def chrome_trace():
+    return _default.chrome_trace()
+
+
+def prometheus_text():
+    return _default.prometheus_text()
+
+
+def save_chrome_trace(path, recorder=None):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump((recorder or _default).chrome_trace(), f)
+
+
+def save_prometheus(path, recorder=None):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write((recorder or _default).prometheus_text())
+
+
+if os.environ.get(ENV_VAR, "") not in ("", "0"):
+    enable()
@@ -0,0 +1,7 @@
+# tests/conftest.py
+"""The modules are flat scripts at the repository root; make them importable."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,51 @@
+# tests/test_qml_engine.py
+"""NumpyVQC must reproduce a Qiskit VQC's class probabilities and predictions."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("qiskit_machine_learning")
+
+from qml_engine import NumpyVQC, check_parity
+
+
+def _fixed_weights(fun, x0, jac=None, bounds=None):
+    """Optimizer stand-in: 'fit' leaves the weights at the initial point."""
+    from qiskit_algorithms.optimizers import OptimizerResult
+
+    result = OptimizerResult()
+    result.x = np.asarray(x0, dtype=np.float64)
+    result.fun = fun(result.x)
+    result.nfev = 1
+    return result
+
+
+def _qiskit_vqc(reps, weights, X, y):
+    from qiskit.circuit.library import ZZFeatureMap, RealAmplitudes
+    from qiskit_machine_learning.algorithms import VQC
+
+    vqc = VQC(
+        feature_map=ZZFeatureMap(feature_dimension=3, reps=reps, entanglement="linear"),
+        ansatz=RealAmplitudes(num_qubits=3, reps=reps, entanglement="linear"),
+        optimizer=_fixed_weights,
+        initial_point=weights,
+        loss="cross_entropy",
+    )
+    vqc.fit(X, y)
+    return vqc
+
+
+@pytest.mark.parametrize("reps", [1, 2])
+def test_check_parity_matches_qiskit(reps):
+    rng = np.random.default_rng(reps)
+    X = rng.uniform(0, 1, size=(40, 3))
+    y = np.arange(len(X)) % 3  # three trucks
+    weights = rng.uniform(-np.pi, np.pi, size=3 * (reps + 1))
+
+    vqc = _qiskit_vqc(reps, weights, X, y)
+    np.testing.assert_allclose(vqc.weights, weights)
+
+    assert check_parity(vqc, X) <= 1e-6
+    engine = NumpyVQC.from_qiskit(vqc)
+    assert engine.feature_reps == engine.ansatz_reps == reps
+    np.testing.assert_allclose(engine.predict_proba(X).sum(axis=1), 1.0)
@@ -0,0 +1,77 @@
+# tests/test_repair.py
+"""repair_assignments must report feasibility honestly and never do worse than first-fit."""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from repair import repair_assignments, _first_fit
+
+DEPOT = (16.5, 80.6)
+
+
+def _is_feasible(assignments, demands, vehicle_capacity, num_vehicles):
+    assign = np.asarray(assignments)
+    if not ((assign >= 0) & (assign < num_vehicles)).all():
+        return False
+    return bool((np.bincount(assign, weights=demands, minlength=num_vehicles) <= vehicle_capacity).all())
+
+
+def _random_case(rng, max_customers, max_demand):
+    n = int(rng.integers(3, max_customers + 1))
+    num_vehicles = int(rng.integers(2, 4))
+    demands = rng.integers(1, max_demand + 1, n)
+    assignments = rng.integers(0, num_vehicles, n)
+    customers = 16.5 + rng.uniform(0, 0.05, (n, 2))
+    return customers, demands, assignments, num_vehicles
+
+
+def test_clears_overload_that_the_cheapest_move_cannot():
+    customers = [[16.5 + 0.01 * i, 80.6] for i in range(7)]
+    assignments, feasible = repair_assignments(customers, [5, 2, 5, 4, 6, 2, 5], [1, 0, 0, 1, 1, 0, 1], 15, 2, DEPOT)
+    assert feasible
+    assert assignments == [0, 0, 0, 1, 1, 0, 1]
+
+
+def test_feasible_input_is_untouched():
+    assignments, feasible = repair_assignments([[16.5, 80.6]] * 3, [5, 5, 5], [0, 1, 0], 15, 2, DEPOT)
+    assert feasible
+    assert assignments == [0, 1, 0]
+
+
+def test_unassigned_customers_are_placed():
+    assignments, feasible = repair_assignments([[16.5, 80.6]] * 3, [5, 5, 5], [-1, 0, 7], 15, 2, DEPOT)
+    assert feasible
+    assert all(0 <= a < 2 for a in assignments)
+
+
+def test_reports_infeasible_when_the_fleet_is_too_small():
+    demands = [8, 8, 8, 8]
+    assignments, feasible = repair_assignments([[16.5, 80.6]] * 4, demands, [0, 0, 0, 0], 15, 2, DEPOT)
+    assert not feasible
+    assert _is_feasible(assignments, demands, 15, 2) == feasible
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_never_worse_than_first_fit(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(250):
+        customers, demands, assignments, num_vehicles = _random_case(rng, 9, 7)
+        repaired, feasible = repair_assignments(customers, demands, assignments, 15, num_vehicles, DEPOT)
+        assert feasible == _is_feasible(repaired, demands, 15, num_vehicles)
+        baseline, _ = _first_fit(demands, assignments, 15, num_vehicles)
+        if _is_feasible(baseline, demands, 15, num_vehicles):
+            assert feasible
+
+
+def test_small_cases_match_brute_force():
+    rng = np.random.default_rng(7)
+    for _ in range(300):
+        customers, demands, assignments, num_vehicles = _random_case(rng, 7, 8)
+        _, feasible = repair_assignments(customers, demands, assignments, 15, num_vehicles, DEPOT)
+        exists = any(
+            _is_feasible(candidate, demands, 15, num_vehicles)
+            for candidate in itertools.product(range(num_vehicles), repeat=len(demands))
+        )
+        assert feasible == exists